@@ -0,0 +1,315 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from email.message import EmailMessage
+from jinja2 import Environment, FileSystemLoader
+from alert_rules import alert_image
+from db import AlertOutbox, Camera, app, db
+from metrics import email_send_seconds
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+# Implicit TLS (port 465); otherwise STARTTLS is used if the server offers it
+SMTP_SSL = os.getenv("SMTP_SSL", str(SMTP_PORT == 465)).lower() in ("1", "true")
+# Sender address and login; alerts stay in the outbox until both are set
+# (SMTP_PASSWORD may be empty for a server that takes mail without login)
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# An idle connection is closed after this many seconds
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 240))
+# A camera's alerts are held this many seconds after the first one and sent as one digest
+ALERT_DIGEST_WINDOW = float(os.getenv("ALERT_DIGEST_WINDOW", 60))
+# Emails one recipient may get per hour; further alerts wait for a later digest
+ALERT_EMAILS_PER_HOUR = int(os.getenv("ALERT_EMAILS_PER_HOUR", 20))
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", 5))
+# Most alerts in one digest; the rest go in the next one
+MAX_DIGEST_ALERTS = 100
+POLL_INTERVAL = 5
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Compiled once at import; rendering a digest is one pass over its alerts
+template_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True, auto_reload=False
+)
+template_environment.globals["alert_image"] = alert_image
+alert_email_template = template_environment.get_template("alert_email.html")
+
+
+class SMTPConnection:
+    """A logged-in SMTP connection reused across emails, reopened when it drops."""
+
+    def __init__(
+        self,
+        host=SMTP_HOST,
+        port=SMTP_PORT,
+        use_ssl=SMTP_SSL,
+        user=SMTP_USER,
+        password=SMTP_PASSWORD,
+        idle_timeout=SMTP_IDLE_TIMEOUT,
+        timeout=30,
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.server = None
+        self.last_used = 0
+        self.connects = 0
+
+    @property
+    def configured(self):
+        return bool(self.user) and self.password is not None
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls()
+        server.ehlo()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self.server = server
+        self.connects += 1
+
+    def send(self, message):
+        # A server may drop an idle connection at any time; reconnect once
+        for attempt in range(2):
+            if self.server is None:
+                self._connect()
+            try:
+                self.server.send_message(message)
+                self.last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close_if_idle(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+class AlertDispatcher:
+    """Emails alerts from the alert_outbox table on a background thread.
+
+    Alerts are queued durably in the transaction that creates them (see
+    vision.save_captions), so nothing is lost across restarts: whatever is
+    still unsent is picked up when the dispatcher starts. A camera's pending
+    alerts go out as one digest once the oldest has waited digest_window
+    seconds. Each recipient gets at most per_hour emails an hour; alerts over
+    the limit stay queued and join a later digest. A failed send is retried
+    with backoff and given up after max_attempts.
+    """
+
+    def __init__(
+        self,
+        connection=None,
+        digest_window=ALERT_DIGEST_WINDOW,
+        per_hour=ALERT_EMAILS_PER_HOUR,
+        max_attempts=ALERT_MAX_ATTEMPTS,
+        sender=SMTP_USER,
+    ):
+        self.connection = connection or SMTPConnection()
+        self.digest_window = digest_window
+        self.per_hour = per_hour
+        self.max_attempts = max_attempts
+        self.sender = sender
+        self.wake = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.dispatch_lock = threading.Lock()
+        # recipient -> monotonic times of the emails sent in the last hour
+        self.sent_times = defaultdict(deque)
+        # camera_id -> monotonic time before which a failed digest isn't retried
+        self.retry_at = {}
+        # Cameras whose digest is waiting on its recipient's hourly limit
+        self.held = set()
+        self.emails_sent = 0
+        self.alerts_sent = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.warned_unconfigured = False
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="alert-dispatcher", daemon=True
+                )
+                self.thread.start()
+
+    def notify(self):
+        """New alerts are in the outbox."""
+        self.start()
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(min(POLL_INTERVAL, self.digest_window) or POLL_INTERVAL)
+            self.wake.clear()
+            try:
+                with app.app_context():
+                    self.dispatch()
+            except Exception as e:
+                logger.exception("alert dispatch failed: %s", e)
+            self.connection.close_if_idle()
+
+    def dispatch(self):
+        """Send every camera digest that is due. Needs an app context."""
+        with self.dispatch_lock:
+            return self._dispatch()
+
+    def _dispatch(self):
+        if not self.connection.configured:
+            # Nothing is marked sent, so queued alerts go out once SMTP is set up
+            if not self.warned_unconfigured:
+                logger.warning("SMTP_USER/SMTP_PASSWORD not set; alerts stay in the outbox")
+                self.warned_unconfigured = True
+            return 0
+        now = datetime.now()
+        pending = db.session.execute(
+            db.select(AlertOutbox.camera_id, db.func.min(AlertOutbox.created_at))
+            .where(AlertOutbox.sent_at.is_(None))
+            .group_by(AlertOutbox.camera_id)
+        ).all()
+        sent = 0
+        for camera_id, oldest in pending:
+            if (now - oldest).total_seconds() < self.digest_window:
+                continue
+            if time.monotonic() < self.retry_at.get(camera_id, 0):
+                continue
+            sent += self.send_digest(camera_id)
+        return sent
+
+    def _allowed(self, recipient):
+        times = self.sent_times[recipient]
+        while times and time.monotonic() - times[0] > 3600:
+            times.popleft()
+        return len(times) < self.per_hour
+
+    def send_digest(self, camera_id):
+        entries = (
+            AlertOutbox.query.filter(
+                AlertOutbox.camera_id == camera_id, AlertOutbox.sent_at.is_(None)
+            )
+            .order_by(AlertOutbox.id)
+            .limit(MAX_DIGEST_ALERTS)
+            .all()
+        )
+        camera = db.session.get(Camera, camera_id)
+        if camera is None or not camera.email:
+            logger.warning(
+                "no email for camera, dropping alerts",
+                extra={"camera_id": camera_id, "alerts": len(entries)},
+            )
+            self._mark_sent(entries)
+            return 0
+        if not self._allowed(camera.email):
+            # Counted once per held-back digest, not on every poll it waits
+            if camera_id not in self.held:
+                self.held.add(camera_id)
+                self.rate_limited += 1
+            return 0
+        self.held.discard(camera_id)
+
+        alerts = [entry.alert for entry in entries]
+        message = alert_email(camera, alerts, self.sender)
+        keys = [(camera_id, alert.frame_number) for alert in alerts]
+        started = time.perf_counter()
+        try:
+            with tracer.span("alert.email", keys, alerts=len(alerts)):
+                self.connection.send(message)
+        except (smtplib.SMTPException, OSError) as e:
+            email_send_seconds.labels("failed").observe(time.perf_counter() - started)
+            self.failures += 1
+            attempts = max(entry.attempts for entry in entries) + 1
+            for entry in entries:
+                entry.attempts = attempts
+            if attempts >= self.max_attempts:
+                logger.error(
+                    "alert email failed, giving up: %s",
+                    e,
+                    extra={"camera_id": camera_id, "alerts": len(entries)},
+                )
+                self._mark_sent(entries)
+            else:
+                self.retry_at[camera_id] = time.monotonic() + 5 * 2**attempts
+                logger.warning(
+                    "alert email failed, will retry: %s",
+                    e,
+                    extra={"camera_id": camera_id, "attempts": attempts},
+                )
+                db.session.commit()
+            return 0
+
+        email_send_seconds.labels("sent").observe(time.perf_counter() - started)
+        self._mark_sent(entries)
+        self.sent_times[camera.email].append(time.monotonic())
+        self.retry_at.pop(camera_id, None)
+        self.emails_sent += 1
+        self.alerts_sent += len(entries)
+        logger.info("alert email sent", extra={"camera_id": camera_id, "alerts": len(entries)})
+        return 1
+
+    def _mark_sent(self, entries):
+        now = datetime.now()
+        for entry in entries:
+            entry.sent_at = now
+        db.session.commit()
+
+    def stats(self):
+        return {
+            "emails_sent": self.emails_sent,
+            "alerts_sent": self.alerts_sent,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "smtp_connects": self.connection.connects,
+            "smtp_configured": self.connection.configured,
+        }
+
+
+def alert_email(camera, alerts, sender=SMTP_USER):
+    message = EmailMessage()
+    message.set_content(
+        "This email requires an HTML viewer."
+    )  # Fallback for email clients that don't support HTML
+    message.add_alternative(
+        render_alert_email(camera.id, alerts),
+        subtype="html",
+    )
+    message["Subject"] = (
+        "Alert Notification" if len(alerts) == 1 else f"Alert Notification ({len(alerts)} alerts)"
+    )
+    message["From"] = sender
+    message["To"] = camera.email
+    return message
+
+
+def render_alert_email(camera_id, alerts):
+    """HTML body listing alerts (anything with description and alert_type)."""
+    return alert_email_template.render(camera_id=camera_id, alerts=alerts)
+
+
+alert_dispatcher = AlertDispatcher()
@@ -0,0 +1,49 @@
+from collections import namedtuple
+from db import activity_present
+
+# One rule per caption field that raises an alert. build_alerts creates alerts
+# from these rules and the alert email looks its images up here by alert_type,
+# so what is stored and what is emailed come from the same table.
+AlertRule = namedtuple("AlertRule", ["field", "alert_type", "label", "image"])
+
+ALERT_RULES = (
+    AlertRule(
+        "human_activity",
+        "Human Activity",
+        "human_activity detected",
+        "https://img.freepik.com/free-photo/front-view-smiley-man-pointing-side_23-2148946252.jpg",
+    ),
+    AlertRule(
+        "unusual_activity",
+        "Unusual Activity",
+        "Unusual activity detected",
+        "https://www.voisins78.fr/images/images/culture-sport/culture/sherlock.jpg",
+    ),
+    AlertRule(
+        "animal_activity",
+        "Animal Activity",
+        "Animal activity detected",
+        "https://images.pexels.com/photos/45201/kitty-cat-kitten-pet-45201.jpeg",
+    ),
+    AlertRule(
+        "unusual_crowd",
+        "Unusual Crowd Activity",
+        "Unusual crowd activity detected",
+        "https://media.istockphoto.com/id/1400020345/vector/women.jpg",
+    ),
+)
+RULES_BY_TYPE = {rule.alert_type: rule for rule in ALERT_RULES}
+
+
+def matching_rules(cleaned_output):
+    """(rule, description) for each rule whose field is present in the caption."""
+    return [
+        (rule, f"{rule.label}: {cleaned_output[rule.field]}")
+        for rule in ALERT_RULES
+        if activity_present(cleaned_output[rule.field])
+    ]
+
+
+def alert_image(alert_type):
+    rule = RULES_BY_TYPE.get(alert_type)
+    return rule.image if rule else ""
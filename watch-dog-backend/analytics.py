@@ -0,0 +1,226 @@
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from captions import clean_caption
+from db import AnalyticsData, AnalyticsRollup, TranscriptDetailed, activity_present, db
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE for the counter upserts
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+ANALYTICS_COUNTERS = (
+    "total_footage_analyzed",
+    "total_individuals_detected",
+    "total_unusual_incidents",
+    "total_animal_incidents",
+    "total_unusual_crowd_incidents",
+    "total_vehicle_detected",
+)
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+# Most buckets one rollup query may span
+MAX_ROLLUP_BUCKETS = 10_000
+
+
+def analytics_increments(cleaned_output):
+    vehicles = cleaned_output["vehicle_details"]
+    return {
+        "total_footage_analyzed": 1,
+        "total_individuals_detected": int(cleaned_output["number_of_individuals"]),
+        "total_unusual_incidents": int(activity_present(cleaned_output["unusual_activity"])),
+        "total_animal_incidents": int(activity_present(cleaned_output["animal_activity"])),
+        "total_unusual_crowd_incidents": int(activity_present(cleaned_output["unusual_crowd"])),
+        # Count vehicles
+        "total_vehicle_detected": len(vehicles.split(",")) if activity_present(vehicles) else 0,
+    }
+
+
+def bucket_start(created_at, granularity):
+    if granularity == "minute":
+        return created_at.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def average_passerbys(totals):
+    if not totals["total_footage_analyzed"]:
+        return 0.0
+    return totals["total_individuals_detected"] / totals["total_footage_analyzed"]
+
+
+def add_counts(totals, key, increments):
+    counts = totals.setdefault(key, dict.fromkeys(ANALYTICS_COUNTERS, 0))
+    for name, value in increments.items():
+        counts[name] += value
+
+
+def record_captions(entries):
+    """Count (camera_id, created_at, cleaned_output) captions into the analytics tables.
+
+    Adds to each camera's lifetime AnalyticsData row and to its minute, hour
+    and day rollup buckets, one upsert per touched row, inside the caller's
+    transaction.
+    """
+    lifetime, buckets = {}, {}
+    for camera_id, created_at, cleaned_output in entries:
+        increments = analytics_increments(cleaned_output)
+        add_counts(lifetime, (camera_id,), increments)
+        for granularity in GRANULARITIES:
+            add_counts(
+                buckets,
+                (camera_id, granularity, bucket_start(created_at, granularity)),
+                increments,
+            )
+
+    for (camera_id,), totals in lifetime.items():
+        upsert_counts(
+            AnalyticsData,
+            dict(
+                totals,
+                camera_id=camera_id,
+                average_human_passerbys_per_footage=average_passerbys(totals),
+                created_at=datetime.now(),
+            ),
+            average=True,
+        )
+    for (camera_id, granularity, start), totals in buckets.items():
+        upsert_counts(
+            AnalyticsRollup,
+            dict(totals, camera_id=camera_id, granularity=granularity, bucket_start=start),
+        )
+
+
+def upsert_counts(model, row, average=False):
+    """Insert row, or add its counters to the existing row with the same key.
+
+    average also recomputes average_human_passerbys_per_footage from the sums.
+    """
+    table = model.__table__
+    keys = [column.name for column in table.primary_key]
+    insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    if insert is None:
+        # No native upsert: lock the row for the read-modify-write
+        entry = (
+            db.session.query(model)
+            .filter_by(**{key: row[key] for key in keys})
+            .with_for_update()
+            .first()
+        )
+        if entry is None:
+            db.session.add(model(**row))
+            return
+        for name in ANALYTICS_COUNTERS:
+            setattr(entry, name, getattr(entry, name) + row[name])
+        if average:
+            entry.average_human_passerbys_per_footage = average_passerbys(
+                {name: getattr(entry, name) for name in ANALYTICS_COUNTERS}
+            )
+        return
+    statement = insert(table).values(row)
+    added = {name: table.c[name] + statement.excluded[name] for name in ANALYTICS_COUNTERS}
+    if average:
+        added["average_human_passerbys_per_footage"] = (
+            db.cast(added["total_individuals_detected"], db.Float)
+            / added["total_footage_analyzed"]
+        )
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys], set_=added
+        )
+    )
+
+
+def rollups(camera_id, granularity, since, until):
+    """Non-empty buckets of a camera between since and until, oldest first.
+
+    Reads at most one row per bucket through the primary key, however many
+    transcripts the range covers. Raises ValueError on a bad granularity or a
+    range of more than MAX_ROLLUP_BUCKETS buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if (until - since) / GRANULARITIES[granularity] > MAX_ROLLUP_BUCKETS:
+        raise ValueError(f"Range spans more than {MAX_ROLLUP_BUCKETS} {granularity} buckets")
+    query = (
+        db.select(AnalyticsRollup)
+        .where(
+            AnalyticsRollup.camera_id == camera_id,
+            AnalyticsRollup.granularity == granularity,
+            AnalyticsRollup.bucket_start >= bucket_start(since, granularity),
+            AnalyticsRollup.bucket_start <= until,
+        )
+        .order_by(AnalyticsRollup.bucket_start)
+    )
+    results = []
+    for rollup in db.session.execute(query).scalars():
+        totals = {name: getattr(rollup, name) for name in ANALYTICS_COUNTERS}
+        results.append(
+            dict(
+                totals,
+                bucket_start=rollup.bucket_start,
+                average_human_passerbys_per_footage=average_passerbys(totals),
+            )
+        )
+    return results
+
+
+def backfill_rollups(camera_id, batch_size=1000):
+    """Rebuild a camera's rollups from transcripts_detailed.
+
+    Transcripts from before created_at existed have no time and are skipped.
+    """
+    fields = (
+        "number_of_individuals",
+        "unusual_activity",
+        "animal_activity",
+        "unusual_crowd",
+        "vehicle_details",
+    )
+    query = (
+        db.select(
+            TranscriptDetailed.created_at,
+            *(getattr(TranscriptDetailed, field) for field in fields),
+        )
+        .where(
+            TranscriptDetailed.camera_id == camera_id,
+            TranscriptDetailed.created_at.is_not(None),
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    buckets = {}
+    for row in db.session.execute(query).mappings():
+        cleaned_output = clean_caption({field: row[field] or "none" for field in fields})
+        increments = analytics_increments(cleaned_output)
+        for granularity in GRANULARITIES:
+            add_counts(
+                buckets,
+                (granularity, bucket_start(row["created_at"], granularity)),
+                increments,
+            )
+
+    db.session.execute(
+        db.delete(AnalyticsRollup).where(AnalyticsRollup.camera_id == camera_id)
+    )
+    rows = [
+        dict(totals, camera_id=camera_id, granularity=granularity, bucket_start=start)
+        for (granularity, start), totals in buckets.items()
+    ]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(db.insert(AnalyticsRollup), rows[start : start + batch_size])
+    db.session.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # Backfill: python analytics.py [camera_id ...]
+    from db import Camera, app
+
+    with app.app_context():
+        camera_ids = [int(c) for c in sys.argv[1:]] or [
+            c.id for c in Camera.query.all()
+        ]
+        for camera_id in camera_ids:
+            print(f"Camera {camera_id}: rebuilt {backfill_rollups(camera_id)} rollup buckets")
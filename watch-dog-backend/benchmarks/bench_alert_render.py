@@ -0,0 +1,143 @@
+"""Alert email render time per alert and per 100-alert digest.
+
+Compares the old per-email HTML f-string (which rebuilt its image table on
+every call and guessed the alert type back out of the description) with the
+alert_email template, compiled per render and precompiled once as
+alert_dispatcher does. The old f-string is rebuilt from the template's static
+text, so all three produce the same document. "images" counts alert rows that
+got their category image. Run from watch-dog-backend:
+
+    python -m benchmarks.bench_alert_render --repeats 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing db needs a database URL; nothing is read from it
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from alert_dispatcher import TEMPLATE_DIR, render_alert_email, template_environment
+from alert_rules import ALERT_RULES, matching_rules
+
+CAPTION_VALUES = {
+    "human_activity": ["People walking", "A man carrying a ladder", "none"],
+    "unusual_activity": ["Person climbing the fence", "none", "none"],
+    "animal_activity": ["A dog crossing", "none", "none"],
+    "unusual_crowd": ["Group gathering at the gate", "none", "none", "none"],
+}
+
+
+def sample_alerts(count, seed=0):
+    rng = random.Random(seed)
+    alerts = []
+    while len(alerts) < count:
+        caption = {field: rng.choice(values) for field, values in CAPTION_VALUES.items()}
+        for rule, description in matching_rules(caption):
+            alerts.append(SimpleNamespace(alert_type=rule.alert_type, description=description))
+    return alerts[:count]
+
+
+def template_source():
+    with open(os.path.join(TEMPLATE_DIR, "alert_email.html")) as f:
+        return f.read()
+
+
+def legacy_renderer(source):
+    """The old alert_email_html(camera_id, descriptions), around the same static HTML."""
+    before_camera, rest = source.split("{{ camera_id }}", 1)
+    before_list, rest = rest.split("{% for alert in alerts %}", 1)
+    before_rows = rest.split("{% endfor %}", 1)[1].split("{%- for alert in alerts %}", 1)[0]
+    after_rows = rest.split("{%- endfor %}", 1)[1]
+
+    def alert_email_html(camera_id, alerts_list):
+        images = {
+            "human activity": ALERT_RULES[0].image,
+            "Unusual Activity": ALERT_RULES[1].image,
+            "Animal Activity": ALERT_RULES[2].image,
+            "Unusual Crowd Activity": ALERT_RULES[3].image,
+        }
+        alert_html = ""
+        for alert in alerts_list:
+            alert_type = alert.split(":")[0]  # Extract alert type from description
+            image_src = images.get(alert_type, "")
+            alert_html += f"""
+        <tr style="vertical-align: middle;">
+            <td align="center" class="content">
+                <p>{alert}</p>
+                <img src="{image_src}" alt="{alert_type}" class="image" />
+            </td>
+        </tr>
+        """
+        return f"""{before_camera}{camera_id}{before_list}{"".join(f"<li>{alert}</li>" for alert in alerts_list)}{before_rows}{alert_html}{after_rows}"""
+
+    return alert_email_html
+
+
+def time_render(render, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        html = render()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], html
+
+
+def images_matched(html, alerts):
+    return sum(
+        1
+        for alert in alerts
+        if f'src="{next(r.image for r in ALERT_RULES if r.alert_type == alert.alert_type)}"'
+        in html
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--digest", type=int, default=100, help="alerts per digest")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    source = template_source()
+    legacy = legacy_renderer(source)
+    one, digest = sample_alerts(1), sample_alerts(args.digest, seed=1)
+
+    def legacy_digest():
+        # The old sender mailed one email per alert
+        return "".join(legacy(7, [alert.description]) for alert in digest)
+
+    cases = [
+        ("old f-string, 1 alert", lambda: legacy(7, [one[0].description]), one),
+        (
+            "template compiled per call, 1 alert",
+            lambda: template_environment.from_string(source).render(camera_id=7, alerts=one),
+            one,
+        ),
+        ("precompiled template, 1 alert", lambda: render_alert_email(7, one), one),
+        (f"old f-string, {args.digest} emails", legacy_digest, digest),
+        (
+            f"old f-string, {args.digest} in one",
+            lambda: legacy(7, [alert.description for alert in digest]),
+            digest,
+        ),
+        (
+            f"precompiled, {args.digest}-alert digest",
+            lambda: render_alert_email(7, digest),
+            digest,
+        ),
+    ]
+    print(f"{'render':<36} {'median':>10} {'per alert':>11} {'images':>8}")
+    for name, render, alerts in cases:
+        median, html = time_render(render, args.repeats)
+        print(
+            f"{name:<36} {median * 1e6:>8.0f}us {median / len(alerts) * 1e6:>9.1f}us "
+            f"{images_matched(html, alerts):>4}/{len(alerts)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
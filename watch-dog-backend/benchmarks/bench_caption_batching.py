@@ -0,0 +1,109 @@
+"""Requests per minute and prompt tokens per transcript for caption batching.
+
+Several virtual cameras emit scene changes at a fixed rate into a
+CaptionBatcher that sends them to the local stub vision endpoint. Prompt
+tokens count the text of the prompt only (roughly 4 characters per token);
+image tokens are the same per frame with or without batching. Run from
+watch-dog-backend:
+
+    python -m benchmarks.bench_caption_batching --cameras 8 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_vision import StubVision, start_stub
+from caption_batcher import CaptionBatcher
+from captions import CaptionRequestBody, caption_prompt, parse_caption_reply
+from vision_client import VisionClient
+
+FAKE_IMAGE_JPEG = bytes(45_000)
+
+
+def prompt_tokens(count):
+    return len(caption_prompt(count)) / 4
+
+
+async def run_once(batch_size, wait_ms, cameras, seconds, scene_interval, latency):
+    stub = StubVision(latency=latency)
+    runner, url = await start_stub(stub)
+    client = VisionClient(url=url, max_in_flight=64)
+    transcripts = 0
+    tokens = 0.0
+
+    async def handler(frames, camera_id):
+        nonlocal transcripts, tokens
+        payload = CaptionRequestBody([image for _, image in frames])
+        reply = await client.complete(payload)
+        transcripts += len(parse_caption_reply(reply, len(frames)))
+        tokens += prompt_tokens(len(frames))
+
+    # Queues and per-camera requests unbounded: this measures batching alone
+    batcher = CaptionBatcher(
+        handler,
+        max_frames=batch_size,
+        max_wait_ms=wait_ms,
+        max_pending=10**6,
+        max_in_flight=10**6,
+    )
+
+    async def camera(camera_id):
+        frame_number = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frame_number += 1
+            batcher.add(camera_id, (frame_number, FAKE_IMAGE_JPEG))
+            await asyncio.sleep(scene_interval)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(camera(c) for c in range(cameras)))
+        await batcher.drain()
+    finally:
+        await client.close()
+        await runner.cleanup()
+    minutes = (time.perf_counter() - start) / 60
+    return stub.requests / minutes, transcripts, tokens / max(transcripts, 1)
+
+
+async def run(args):
+    print(
+        f"{'K':>3} {'T ms':>5} {'req/min':>8} {'transcripts':>11} "
+        f"{'prompt tok/transcript':>21}"
+    )
+    for batch_size in args.batch_sizes:
+        rpm, transcripts, tokens = await run_once(
+            batch_size,
+            args.wait_ms,
+            args.cameras,
+            args.seconds,
+            args.scene_interval,
+            args.latency,
+        )
+        print(
+            f"{batch_size:>3} {args.wait_ms:>5} {rpm:>8.0f} {transcripts:>11} "
+            f"{tokens:>21.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument(
+        "--scene-interval", type=float, default=0.1, help="seconds between scene changes"
+    )
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--wait-ms", type=int, default=500)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
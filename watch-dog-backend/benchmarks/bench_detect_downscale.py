@@ -0,0 +1,135 @@
+"""Per-frame scene detection latency and allocation, full frame vs downscaled.
+
+Decodes a recorded clip (--clip, or a synthetic 1080p one written to a temp
+file) and runs every frame through HashDetector on the full BGR frame, as
+before, and through DetectionDownscaler plus SceneHashDetector on the small
+grayscale buffer. "allocated" is the tracemalloc peak per frame (numpy and
+OpenCV outputs are numpy arrays, so both are counted). Run from
+watch-dog-backend:
+
+    python -m benchmarks.bench_detect_downscale --clip recording.mp4 --frames 600
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_encode import cctv_like_frame
+from scene_pool import (
+    HASH_THRESHOLD,
+    DetectionDownscaler,
+    SceneHashDetector,
+    new_scene_manager,
+)
+from scenedetect.detectors import HashDetector
+
+# Frames two cuts may be apart and still count as the same scene change
+CUT_TOLERANCE = 5
+
+
+def write_clip(path, frames, fps=30, scene_frames=90, shape=(1080, 1920, 3)):
+    """Still scenes with a person-sized box walking across, cutting every scene_frames frames."""
+    writer = None
+    scenes = [cctv_like_frame(shape, seed=seed) for seed in range(4)]
+    height = shape[0]
+    for i in range(frames):
+        frame = scenes[(i // scene_frames) % len(scenes)].copy()
+        x = (i * 4) % (frame.shape[1] - 40)
+        cv2.rectangle(frame, (x, height * 5 // 9), (x + 40, height * 2 // 3), (40, 40, 200), -1)
+        if writer is None:
+            height, width = frame.shape[:2]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+        writer.write(frame)
+    writer.release()
+
+
+def read_clip(path, limit):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def full_frame_path():
+    scene_manager = new_scene_manager(HashDetector(threshold=HASH_THRESHOLD))
+    return lambda n, frame: scene_manager._process_frame(n, frame)
+
+
+def downscaled_path():
+    downscaler = DetectionDownscaler()
+    scene_manager = new_scene_manager(SceneHashDetector())
+    return lambda n, frame: scene_manager._process_frame(n, downscaler.prepare(frame))
+
+
+def run(make_path, frames):
+    detect = make_path()
+    times, peaks, cuts = [], [], []
+    tracemalloc.start()
+    for n, frame in enumerate(frames):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if detect(n, frame):
+            cuts.append(n)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    times.sort()
+    return {
+        "median_ms": times[len(times) // 2] * 1000,
+        "p95_ms": times[int(len(times) * 0.95)] * 1000,
+        "allocated_kb": sum(peaks) / len(peaks) / 1024,
+        "cuts": cuts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clip", help="recorded video file (default: synthetic 1080p clip)")
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args()
+
+    clip = args.clip
+    if clip is None:
+        clip = tempfile.NamedTemporaryFile(suffix=".avi", delete=False).name
+        write_clip(clip, args.frames)
+    try:
+        frames = read_clip(clip, args.frames)
+    finally:
+        if args.clip is None:
+            os.unlink(clip)
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames at {width}x{height}")
+
+    results = {
+        "full BGR frame": run(full_frame_path, frames),
+        "downscaled gray": run(downscaled_path, frames),
+    }
+    print(f"{'detection input':<16} {'median':>9} {'p95':>9} {'allocated':>11} {'cuts':>5}")
+    for name, result in results.items():
+        print(
+            f"{name:<16} {result['median_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+            f"{result['allocated_kb']:>8.1f}KiB {len(result['cuts']):>5}"
+        )
+    full, small = (r["cuts"] for r in results.values())
+    matched = sum(1 for cut in small if any(abs(cut - other) <= CUT_TOLERANCE for other in full))
+    print(
+        f"downscaled cuts within {CUT_TOLERANCE} frames of a full-frame cut: "
+        f"{matched}/{len(small)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
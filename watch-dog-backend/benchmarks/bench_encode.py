@@ -0,0 +1,106 @@
+"""Bytes copied and time per frame from ndarray to vision request body.
+
+Compares the old path (full-resolution JPEG at quality 50, base64 str,
+prompt f-string, json.dumps, utf-8 body) with FrameEncoder plus the streamed
+CaptionRequestBody. "bytes materialized" sums the size of every full-size
+intermediate object a frame goes through; "peak" is the tracemalloc high-water
+mark while encoding one frame. Run from watch-dog-backend:
+
+    python -m benchmarks.bench_encode --frames 50
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from captions import CAPTION_PROMPT, CaptionRequestBody, build_caption_payload
+from frame_encoder import FrameEncoder
+
+
+def cctv_like_frame(shape=(1080, 1920, 3), seed=0):
+    """Smooth gradients, a few solid shapes and sensor noise; compresses like real footage."""
+    rng = np.random.default_rng(seed)
+    height, width = shape[:2]
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.empty(shape, dtype=np.uint8)
+    frame[..., 0] = (x * 255 // width).astype(np.uint8)
+    frame[..., 1] = (y * 255 // height).astype(np.uint8)
+    frame[..., 2] = ((x + y) * 255 // (width + height)).astype(np.uint8)
+    for _ in range(20):
+        x0, y0 = rng.integers(0, width - 200), rng.integers(0, height - 200)
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(frame, (x0, y0), (x0 + 180, y0 + 120), color, -1)
+    noise = rng.integers(-8, 9, size=shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def old_path(frame):
+    _, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 50])
+    image_b64 = base64.b64encode(buffer).decode("utf-8")
+    content = f'{CAPTION_PROMPT} <img src="data:image/png;base64,{image_b64}" />'
+    payload = build_caption_payload([image_b64])
+    payload["messages"][0]["content"] = content
+    body = json.dumps(payload).encode()
+    materialized = buffer.nbytes + 2 * len(image_b64) + len(content) + 2 * len(body)
+    return len(body), materialized
+
+
+def new_path(frame, encoder):
+    image_jpeg = encoder.encode(frame)
+    body = CaptionRequestBody([image_jpeg])
+    # The resize target is reused across frames, so it isn't a per-frame copy
+    sent = 0
+    largest_chunk = 0
+    for chunk in body:
+        sent += len(chunk)
+        largest_chunk = max(largest_chunk, len(chunk))
+    return sent, image_jpeg.nbytes + largest_chunk
+
+
+def measure(name, fn, frames):
+    times = []
+    sizes = []
+    materialized = []
+    peaks = []
+    for frame in frames:
+        tracemalloc.start()
+        start = time.perf_counter()
+        size, copied = fn(frame)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        sizes.append(size)
+        materialized.append(copied)
+    print(
+        f"{name:>5} {np.mean(times) * 1000:>9.2f} {np.mean(sizes) / 1024:>10.1f} "
+        f"{np.mean(materialized) / 1024:>12.1f} {np.mean(peaks) / 1024:>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    frames = [
+        cctv_like_frame((args.height, args.width, 3), seed=i) for i in range(args.frames)
+    ]
+    encoder = FrameEncoder()
+    print(f"{'path':>5} {'ms/frame':>9} {'body KiB':>10} {'copied KiB':>12} {'peak KiB':>9}")
+    measure("old", old_path, frames)
+    measure("new", lambda f: new_path(f, encoder), frames)
+    print(f"encoder settled on quality {encoder.quality}, {encoder.encodes} encodes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""End-to-end ingest -> detect -> caption -> DB -> alert benchmark, as JSON.
+
+Runs the real StreamSupervisor on replay:// virtual cameras (a recorded clip
+via --clip, or a synthetic one), captioned by the local stub vision endpoint
+(--latency, --error-rate, --unusual-rate), written to a scratch SQLite file
+or --db-url (its tables are dropped and recreated), with alerts emailed to
+the local stub SMTP server (needs aiosmtpd; --no-smtp keeps alerts in the
+outbox). Each camera count runs in its own process so memory high-water
+marks don't carry over. Run from watch-dog-backend:
+
+    python -m benchmarks.bench_pipeline --cameras 1 4 16 --seconds 30 --output results.json
+
+Per camera count it reports frames decoded/s, scene changes/s, scene change
+to caption latency percentiles, caption DB transaction latency, caption
+cache hits, caption queue drops, alerts and emails, and peak RSS.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in points}
+    values = sorted(values)
+    return {
+        f"p{p}": round(values[min(len(values) - 1, len(values) * p // 100)] * 1000, 2)
+        for p in points
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_vision_stub(args):
+    """Stub vision endpoint on its own event loop thread; returns (stub, url)."""
+    from benchmarks.stub_vision import StubVision, start_stub
+
+    stub = StubVision(
+        latency=args.latency, error_rate=args.error_rate, unusual_rate=args.unusual_rate
+    )
+    loop = asyncio.new_event_loop()
+    _, url = loop.run_until_complete(start_stub(stub))
+    threading.Thread(target=loop.run_forever, name="stub-vision", daemon=True).start()
+    return stub, url
+
+
+def instrument(frame, vision):
+    """Record scene change -> caption latency and caption transaction times."""
+    batcher, writer = frame.caption_batcher, vision.caption_writer
+    queued, caption_latencies, write_times = {}, [], []
+    add, handler, save = batcher.add, batcher.handler, writer.handler
+
+    def timed_add(camera_id, item):
+        queued[(camera_id, item[0])] = time.perf_counter()
+        add(camera_id, item)
+
+    async def timed_handler(frames, camera_id):
+        captions = await handler(frames, camera_id)
+        now = time.perf_counter()
+        for (frame_number, _, _), caption in zip(frames, captions):
+            if caption:
+                caption_latencies.append(now - queued.pop((camera_id, frame_number)))
+        return captions
+
+    def timed_save(items):
+        start = time.perf_counter()
+        save(items)
+        write_times.append((time.perf_counter() - start, len(items)))
+
+    batcher.add, batcher.handler, writer.handler = timed_add, timed_handler, timed_save
+    return caption_latencies, write_times
+
+
+def run_cameras(args):
+    """Child process: one run at args.run_cameras cameras; writes JSON to args.result_file."""
+    from db import Alert, AlertOutbox, Camera, TranscriptDetailed, app, db
+    import frame
+    import vision
+    from alert_dispatcher import alert_dispatcher
+    from caption_cache import caption_cache
+    from frame_source import recorded_clip
+    from supervisor import StreamSupervisor
+    from logs import configure_logging
+
+    # --verbose shows the pipeline's logs, at LOG_LEVEL
+    configure_logging()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(
+            Camera(
+                id=camera_id,
+                name=f"virtual-{camera_id}",
+                monitoring=True,
+                email=f"camera-{camera_id}@example.com",
+                live=True,
+                url="replay",
+                start_time=db.func.current_timestamp(),
+            )
+            for camera_id in range(1, args.run_cameras + 1)
+        )
+        db.session.commit()
+
+    smtp_stub = controller = None
+    if not args.no_smtp:
+        from benchmarks.stub_smtp import StubSMTP, start_stub as start_smtp_stub
+
+        smtp_stub = StubSMTP()
+        controller = start_smtp_stub(smtp_stub, port=int(os.environ["SMTP_PORT"]))
+
+    vision_stub, vision.vision_client.url = start_vision_stub(args)
+    caption_latencies, write_times = instrument(frame, vision)
+
+    # Decode the clip before the clock starts; every camera replays this copy
+    recorded_clip(args.clip)
+    supervisor = StreamSupervisor(max_active=args.run_cameras)
+    start = time.perf_counter()
+    for camera_id in range(1, args.run_cameras + 1):
+        offset = (camera_id - 1) * args.offset
+        supervisor.start(camera_id, f"replay://{args.clip}?speed={args.speed}&offset={offset}")
+    time.sleep(args.seconds)
+    streams = supervisor.status()
+    caption_queue = frame.caption_batcher.stats()
+    elapsed = time.perf_counter() - start
+    workers = list(supervisor.workers.values())
+    supervisor.stop_all()
+    for worker in workers:
+        worker.join(timeout=10)
+    asyncio.run_coroutine_threadsafe(frame.caption_batcher.drain(), supervisor.loop).result(
+        timeout=120
+    )
+    vision.caption_writer.drain()
+    if smtp_stub is not None:
+        # Let digests that came due during the drain go out
+        time.sleep(float(os.environ["ALERT_DIGEST_WINDOW"]) + 1)
+        with app.app_context():
+            alert_dispatcher.dispatch()
+
+    with app.app_context():
+        transcripts = db.session.query(TranscriptDetailed).count()
+        alerts = db.session.query(Alert).count()
+        unsent = db.session.query(AlertOutbox).filter(AlertOutbox.sent_at.is_(None)).count()
+    if controller is not None:
+        controller.stop()
+
+    totals = {
+        key: sum(stream[key] for stream in streams)
+        for key in ("frames_decoded", "frames_sampled", "frames_processed", "scenes_detected")
+    }
+    result = {
+        "cameras": args.run_cameras,
+        "seconds": round(elapsed, 2),
+        "frames_per_s": round(totals["frames_decoded"] / elapsed, 1),
+        "frames_detected_per_s": round(totals["frames_processed"] / elapsed, 1),
+        "scene_changes_per_s": round(totals["scenes_detected"] / elapsed, 2),
+        "frames_dropped": sum(stream["frames_dropped"] for stream in streams),
+        "vision_requests": vision_stub.requests,
+        "vision_errors": vision_stub.errors,
+        "caption_cache": caption_cache.stats(),
+        "caption_queue": {
+            key: caption_queue[key] for key in ("policy", "depth", "dropped", "oldest_age_s")
+        },
+        "captions": len(caption_latencies),
+        "caption_latency_ms": percentiles(caption_latencies),
+        "db_transactions": len(write_times),
+        "db_write_ms": percentiles([seconds for seconds, _ in write_times]),
+        "db_write_per_caption_ms": round(
+            sum(s for s, _ in write_times) * 1000 / max(1, sum(n for _, n in write_times)), 3
+        ),
+        "transcripts": transcripts,
+        "alerts": alerts,
+        "alerts_unsent": unsent,
+        "emails": len(smtp_stub.messages) if smtp_stub is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    with open(args.result_file, "w") as f:
+        json.dump(result, f)
+
+
+def child_env(args, scratch):
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.db_url or f"sqlite:///{os.path.join(scratch, 'pipeline.db')}",
+        FRAME_STORE_DIR=os.path.join(scratch, "frames"),
+        VECTOR_INDEX_DIR=os.path.join(scratch, "vectors"),
+        SMTP_HOST="127.0.0.1",
+        SMTP_PORT=str(free_port()),
+        SMTP_SSL="false",
+        SMTP_USER="alerts@example.com",
+        SMTP_PASSWORD="",
+        # With no SMTP stub nothing may come due (and go to a real server)
+        ALERT_DIGEST_WINDOW="1" if not args.no_smtp else "1e9",
+    )
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--clip", help="recorded video to replay (default: synthetic 720p)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, x real time")
+    parser.add_argument("--offset", type=int, default=37, help="replay offset between cameras")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub vision seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--unusual-rate", type=float, default=0.1)
+    parser.add_argument("--db-url", help="scratch database URL whose tables may be dropped")
+    parser.add_argument("--no-smtp", action="store_true", help="don't start the stub SMTP server")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    parser.add_argument("--run-cameras", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_cameras:
+        run_cameras(args)
+        return
+
+    scratch = tempfile.mkdtemp(prefix="bench-pipeline-")
+    try:
+        if args.clip is None:
+            from benchmarks.bench_detect_downscale import write_clip
+
+            args.clip = os.path.join(scratch, "clip.avi")
+            write_clip(args.clip, 450, shape=(720, 1280, 3))
+        results = []
+        for cameras in args.cameras:
+            result_file = os.path.join(scratch, f"result-{cameras}.json")
+            if os.path.exists(os.path.join(scratch, "frames")):
+                shutil.rmtree(os.path.join(scratch, "frames"))
+            command = [sys.executable, "-m", "benchmarks.bench_pipeline"]
+            command += sys.argv[1:] + ["--run-cameras", str(cameras)]
+            command += ["--result-file", result_file, "--clip", args.clip]
+            subprocess.run(
+                command,
+                cwd=BACKEND_DIR,
+                env=child_env(args, scratch),
+                check=True,
+                stdout=None if args.verbose else subprocess.DEVNULL,
+                stderr=None if args.verbose else subprocess.DEVNULL,
+            )
+            with open(result_file) as f:
+                results.append(json.load(f))
+            print(
+                f"{cameras} cameras: {results[-1]['frames_per_s']} frames/s, "
+                f"{results[-1]['captions']} captions",
+                file=sys.stderr,
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "config": {
+            key: getattr(args, key)
+            for key in ("seconds", "speed", "latency", "error_rate", "unusual_rate", "no_smtp")
+        },
+        "database": (args.db_url or "sqlite").split(":")[0],
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Dashboard and chat query latency with and without the db.py indexes.
+
+Seeds transcripts, alerts and chats for several cameras, then times each hot
+query with the model indexes dropped and again with them created. The
+activity listing is timed both as the old free-text `!= "none"` filter and
+through the boolean flag and its partial index. Uses a temporary SQLite file
+unless --scratch-url points at a throwaway database (Postgres works too; its
+tables are dropped and recreated). Run from watch-dog-backend:
+
+    python -m benchmarks.bench_queries --transcripts 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Parsed at import: DATABASE_URL has to be set before db is imported
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--transcripts", type=int, default=200_000)
+parser.add_argument("--cameras", type=int, default=8)
+parser.add_argument("--repeats", type=int, default=30)
+parser.add_argument("--scratch-url", help="database URL whose tables may be dropped")
+args = parser.parse_args()
+
+scratch = None
+if args.scratch_url is None:
+    scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    args.scratch_url = f"sqlite:///{scratch.name}"
+os.environ["DATABASE_URL"] = args.scratch_url
+
+from db import (
+    ACTIVITY_FLAGS,
+    Alert,
+    Camera,
+    Chats,
+    TranscriptDetailed,
+    activity_present,
+    app,
+    db,
+)
+from transcript_repository import CHAT_FIELDS, transcripts_select
+
+START = datetime(2026, 1, 1)
+# Seconds between a camera's scene changes
+SCENE_INTERVAL = 30
+
+
+def seed(connection, rng, transcripts, cameras, batch=10_000):
+    connection.execute(
+        db.insert(Camera),
+        [
+            {
+                "id": c,
+                "name": f"camera-{c}",
+                "monitoring": True,
+                "email": "ops@example.com",
+                "live": True,
+                "url": "rtsp://example",
+                "start_time": START,
+            }
+            for c in range(1, cameras + 1)
+        ],
+    )
+    rows, alerts = [], []
+    for i in range(transcripts):
+        camera_id = i % cameras + 1
+        frame_number = (i // cameras) * 90
+        created_at = START + timedelta(seconds=(i // cameras) * SCENE_INTERVAL)
+        unusual = rng.random() < 0.02
+        row = {
+            "camera_id": camera_id,
+            "frame_number": frame_number,
+            "unusual_activity": "Person climbing the fence" if unusual else "none",
+            "human_activity": "People walking" if rng.random() < 0.4 else "none",
+            "animal_activity": "A dog crossing" if rng.random() < 0.05 else "none",
+            "unusual_crowd": "unusual crowd" if rng.random() < 0.01 else "none",
+            "context_notes": "A typical street scene; time: day",
+            "created_at": created_at,
+        }
+        for field, flag in ACTIVITY_FLAGS.items():
+            row[flag] = activity_present(row[field])
+        rows.append(row)
+        if unusual:
+            alerts.append(
+                {
+                    "camera_id": camera_id,
+                    "alert_type": "Unusual Activity",
+                    "description": "Person climbing the fence",
+                    "timestamp": created_at,
+                    "status": "unacknowledged" if rng.random() < 0.2 else "acknowledged",
+                    "frame_number": frame_number,
+                }
+            )
+        if len(rows) == batch:
+            connection.execute(db.insert(TranscriptDetailed), rows)
+            rows = []
+    if rows:
+        connection.execute(db.insert(TranscriptDetailed), rows)
+    if alerts:
+        connection.execute(db.insert(Alert), alerts)
+    connection.execute(
+        db.insert(Chats),
+        [
+            {
+                "camera_id": i % cameras + 1,
+                "request": "anyone at the gate?",
+                "response": "No one was at the gate.",
+                "frames": [i],
+            }
+            for i in range(max(1, transcripts // 100))
+        ],
+    )
+
+
+def hot_queries(rng, transcripts, cameras):
+    """(name, callable returning a SELECT) for the dashboard and chat paths."""
+    per_camera = transcripts // cameras
+    span = timedelta(seconds=per_camera * SCENE_INTERVAL)
+
+    def camera():
+        return rng.randint(1, cameras)
+
+    def window():
+        since = START + span * rng.random() * 0.9
+        return since, since + timedelta(hours=1)
+
+    return [
+        (
+            "transcripts page (keyset)",
+            lambda: transcripts_select(
+                camera(), CHAT_FIELDS, after_id=rng.randint(0, transcripts), limit=100
+            ),
+        ),
+        (
+            "activity, text != 'none'",
+            lambda: db.select(TranscriptDetailed.id, TranscriptDetailed.unusual_activity)
+            .where(
+                TranscriptDetailed.camera_id == camera(),
+                TranscriptDetailed.unusual_activity != "none",
+            )
+            .order_by(TranscriptDetailed.id)
+            .limit(100),
+        ),
+        (
+            "activity, boolean flag",
+            lambda: transcripts_select(
+                camera(), ("id", "unusual_activity"), "unusual_activity", limit=100
+            ),
+        ),
+        (
+            "keyframe by frame_number",
+            lambda: db.select(TranscriptDetailed.id).where(
+                TranscriptDetailed.camera_id == camera(),
+                TranscriptDetailed.frame_number == rng.randint(0, per_camera) * 90,
+            ),
+        ),
+        (
+            "transcripts, 1h window",
+            lambda: transcripts_select(
+                camera(), CHAT_FIELDS, None, None, 100, *window()
+            ),
+        ),
+        (
+            "alerts, 1h window",
+            lambda: db.select(Alert.id)
+            .where(Alert.camera_id == camera(), Alert.timestamp.between(*window()))
+            .order_by(Alert.id),
+        ),
+        (
+            "unacknowledged alerts",
+            lambda: db.select(Alert.id)
+            .where(Alert.camera_id == camera(), Alert.status == "unacknowledged")
+            .order_by(Alert.id)
+            .limit(100),
+        ),
+        (
+            "chat history page",
+            lambda: db.select(Chats.id)
+            .where(Chats.camera_id == camera())
+            .order_by(Chats.id.desc())
+            .limit(50),
+        ),
+    ]
+
+
+def time_queries(connection, queries, repeats):
+    results = {}
+    for name, make_query in queries:
+        times = []
+        for _ in range(repeats):
+            query = make_query()
+            start = time.perf_counter()
+            connection.execute(query).all()
+            times.append(time.perf_counter() - start)
+        results[name] = sorted(times)[len(times) // 2]
+    return results
+
+
+def model_indexes():
+    return [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+
+def main():
+    with app.app_context():
+        engine = db.engine
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        seed(connection, rng, args.transcripts, args.cameras)
+    print(
+        f"Seeded {args.transcripts:,} transcripts over {args.cameras} cameras "
+        f"({engine.dialect.name}) in {time.perf_counter() - start:.1f}s"
+    )
+
+    queries = hot_queries(rng, args.transcripts, args.cameras)
+    with engine.begin() as connection:
+        for index in model_indexes():
+            index.drop(connection)
+    with engine.connect() as connection:
+        before = time_queries(connection, queries, args.repeats)
+    with engine.begin() as connection:
+        for index in model_indexes():
+            index.create(connection)
+        if engine.dialect.name == "sqlite":
+            connection.exec_driver_sql("ANALYZE")
+    with engine.connect() as connection:
+        after = time_queries(connection, queries, args.repeats)
+
+    print(f"{'query':<28} {'no indexes':>12} {'indexed':>10} {'speedup':>9}")
+    for name, _ in queries:
+        print(
+            f"{name:<28} {before[name] * 1000:>10.2f}ms {after[name] * 1000:>8.2f}ms "
+            f"{before[name] / after[name]:>8.0f}x"
+        )
+
+    engine.dispose()
+    if scratch is not None:
+        os.unlink(scratch.name)
+
+
+if __name__ == "__main__":
+    main()
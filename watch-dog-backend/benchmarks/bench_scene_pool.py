@@ -0,0 +1,111 @@
+"""Inline vs process-pool scene detection throughput.
+
+Feeds synthetic 1080p frames from N camera threads through scene
+detection, either inline on each thread or through scene_pool.ScenePool,
+and reports frames per second. As in frame.process_a_frame, each camera
+thread shrinks its frames with a DetectionDownscaler and only the small
+image is detected on (--full-frames detects on the 1080p frames instead).
+Run from watch-dog-backend:
+
+    python -m benchmarks.bench_scene_pool --frames 300
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scene_pool import DetectionDownscaler, ScenePool, new_scene_manager
+
+
+def synthetic_frames(count=8, shape=(1080, 1920, 3), seed=0):
+    """A handful of distinct frames, cycled so generation cost stays out of the timing."""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=shape, dtype=np.uint8) for _ in range(count)]
+
+
+def frame_at(frames, i):
+    # Hold each frame for 20 reads so there are both still stretches and cuts
+    return frames[(i // 20) % len(frames)]
+
+
+def detect_input(downscaler, frame):
+    return frame if downscaler is None else downscaler.prepare(frame)
+
+
+def run_inline(streams, frames_per_stream, frames, downscale=True):
+    def run():
+        scene_manager = new_scene_manager()
+        downscaler = DetectionDownscaler() if downscale else None
+        for i in range(1, frames_per_stream + 1):
+            scene_manager._process_frame(i, detect_input(downscaler, frame_at(frames, i)))
+
+    threads = [threading.Thread(target=run) for _ in range(streams)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def run_pooled(pool, streams, frames_per_stream, frames, downscale=True):
+    cuts = {s: [] for s in range(streams)}
+
+    def run(stream_id):
+        downscaler = DetectionDownscaler() if downscale else None
+        for i in range(1, frames_per_stream + 1):
+            frame = frame_at(frames, i)
+            pool.submit(
+                stream_id,
+                i,
+                frame,
+                lambda n, f: cuts[stream_id].append(n),
+                detect_input(downscaler, frame),
+            )
+        pool.release(stream_id)
+
+    threads = [threading.Thread(target=run, args=(s,)) for s in range(streams)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    for stream_cuts in cuts.values():
+        assert stream_cuts == sorted(stream_cuts), "results out of frame order"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=300, help="frames per stream")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--full-frames", action="store_true", help="detect on 1080p frames, not downscaled ones"
+    )
+    args = parser.parse_args()
+
+    frames = synthetic_frames()
+    pool = ScenePool(workers=args.workers)
+    print(f"{'streams':>7} {'inline fps':>11} {'pooled fps':>11} {'speedup':>8}")
+    try:
+        for streams in args.streams:
+            total = streams * args.frames
+            inline = run_inline(streams, args.frames, frames, not args.full_frames)
+            pooled = run_pooled(pool, streams, args.frames, frames, not args.full_frames)
+            print(
+                f"{streams:>7} {total / inline:>11.1f} {total / pooled:>11.1f} "
+                f"{inline / pooled:>7.2f}x"
+            )
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
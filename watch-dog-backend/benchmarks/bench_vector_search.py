@@ -0,0 +1,114 @@
+"""Chat retrieval latency over a camera's whole transcript history.
+
+Fills a temporary vector index with random unit-length embeddings (no model
+needed) and times CameraVectorIndex.search over all rows and over the newest
+tenth via the time filter. The old search (pandas Series.apply computing one
+cosine similarity per row, then nlargest) is timed on up to --baseline-rows
+rows and extrapolated linearly past that. Run from watch-dog-backend:
+
+    python -m benchmarks.bench_vector_search --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_query.vector_index import ROW_DTYPE, CameraVectorIndex
+
+
+def unit_vectors(rng, count, dim):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def fill(index, rng, size, dim, chunk=100_000):
+    for start in range(0, size, chunk):
+        count = min(chunk, size - start)
+        rows = np.empty(count, dtype=ROW_DTYPE)
+        rows["transcript_id"] = np.arange(start + 1, start + count + 1)
+        rows["frame_number"] = rows["transcript_id"] * 30
+        rows["created_at"] = rows["transcript_id"]
+        index.append(unit_vectors(rng, count, dim), rows)
+
+
+def old_search(query_embedding, df):
+    def cosine_similarity(a, b):
+        a = np.array(a)
+        b = np.array(b)
+        return np.dot(a, b.T) / (np.linalg.norm(a) * np.linalg.norm(b, axis=1))
+
+    similarities = df["description_embedding"].apply(
+        lambda x: cosine_similarity([query_embedding], [x])[0][0]
+    )
+    return df.loc[similarities.nlargest(3).index, "frame_number"]
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 is 384")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline-rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = unit_vectors(rng, 1, args.dim)[0]
+    print(
+        f"{'transcripts':>12} {'old apply':>12} {'search all':>12} {'newest 10%':>12} {'speedup':>9}"
+    )
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix="bench-vectors-")
+        try:
+            index = CameraVectorIndex(directory)
+            fill(index, rng, size, args.dim)
+            embeddings, rows = index.view()
+
+            baseline_rows = min(size, args.baseline_rows)
+            df = pd.DataFrame(
+                {
+                    "frame_number": rows["frame_number"][:baseline_rows],
+                    "description_embedding": list(np.array(embeddings[:baseline_rows])),
+                }
+            )
+            old = timed(lambda: old_search(query, df), 1) * size / baseline_rows
+            estimated = "*" if baseline_rows < size else " "
+
+            # First pass pages the matrix in; report warm timings
+            index.search(query, args.k)
+            new = timed(lambda: index.search(query, args.k), args.repeats)
+            since = size - size // 10
+            recent = timed(lambda: index.search(query, args.k, since=since), args.repeats)
+
+            scores, _ = index.search(query, args.k)
+            exact = np.sort(np.asarray(embeddings) @ query)[::-1][: args.k]
+            assert np.allclose(scores, exact), "top-k mismatch"
+
+            print(
+                f"{size:>12,} {old * 1000:>10.1f}ms{estimated} {new * 1000:>10.2f}ms "
+                f"{recent * 1000:>10.2f}ms {old / new:>8.0f}x"
+            )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    print("* extrapolated from --baseline-rows rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Caption throughput of VisionClient against the local stub endpoint.
+
+With a fixed round-trip latency, requests per second should grow with the
+in-flight limit rather than stay at 1 / latency. Run from watch-dog-backend:
+
+    python -m benchmarks.bench_vision_client --requests 200 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_vision import StubVision, start_stub
+from vision_client import VisionClient
+
+
+async def run(requests, latency, error_rate, limits):
+    print(f"{'in-flight':>9} {'req/s':>8} {'errors':>7} {'peak':>5}")
+    for limit in limits:
+        stub = StubVision(latency=latency, error_rate=error_rate)
+        runner, url = await start_stub(stub)
+        client = VisionClient(url=url, max_in_flight=limit, backoff=0.01)
+        payload = {"messages": [{"role": "user", "content": "caption"}]}
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(client.complete(payload) for _ in range(requests)))
+            elapsed = time.perf_counter() - start
+        finally:
+            await client.close()
+            await runner.cleanup()
+        print(
+            f"{limit:>9} {requests / elapsed:>8.1f} {stub.errors:>7} "
+            f"{stub.max_in_flight:>5}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency, args.error_rate, args.limits))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Local stand-in for an OpenTelemetry collector's OTLP/HTTP JSON receiver.
+
+Accepts POST /v1/traces and appends each span to a JSONL file in the same
+flat form tracing.FileExporter writes, so `python tracing.py` summarizes
+either. Standalone:
+
+    python -m benchmarks.stub_collector --port 4318 --output traces.jsonl
+
+then point the backend at it with TRACE_OTLP_URL=http://127.0.0.1:4318/v1/traces
+"""
+
+import argparse
+import json
+from aiohttp import web
+
+
+def attribute_value(value):
+    (kind, raw), = value.items()
+    return int(raw) if kind == "intValue" else raw
+
+
+class StubCollector:
+    def __init__(self, output):
+        self.output = output
+        self.requests = 0
+        self.spans = 0
+
+    async def handle(self, request):
+        payload = await request.json()
+        self.requests += 1
+        spans = [
+            {
+                "traceId": span["traceId"],
+                "spanId": span["spanId"],
+                "name": span["name"],
+                "startTimeUnixNano": int(span["startTimeUnixNano"]),
+                "endTimeUnixNano": int(span["endTimeUnixNano"]),
+                "attributes": {
+                    a["key"]: attribute_value(a["value"]) for a in span.get("attributes", [])
+                },
+            }
+            for resource_spans in payload["resourceSpans"]
+            for scope_spans in resource_spans["scopeSpans"]
+            for span in scope_spans["spans"]
+        ]
+        self.spans += len(spans)
+        with open(self.output, "a") as f:
+            f.writelines(json.dumps(span) + "\n" for span in spans)
+        return web.json_response({"partialSuccess": {}})
+
+    def app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v1/traces", self.handle)
+        return app
+
+
+async def start_stub(stub, host="127.0.0.1", port=0):
+    """Serve stub on the running loop; returns (runner, url)."""
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/v1/traces"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default="traces.jsonl")
+    args = parser.parse_args()
+    web.run_app(StubCollector(args.output).app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Local SMTP stand-in that records alert emails instead of delivering them.
+
+Needs aiosmtpd (pip install aiosmtpd). Standalone:
+
+    python -m benchmarks.stub_smtp --port 8025
+
+then point the backend at it with SMTP_HOST=127.0.0.1 SMTP_PORT=8025
+SMTP_SSL=false SMTP_USER=alerts@example.com SMTP_PASSWORD= (no TLS, no login).
+"""
+
+import argparse
+import time
+from aiosmtpd.controller import Controller
+
+
+class StubSMTP:
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        if self.verbose:
+            subject = next(
+                (
+                    line
+                    for line in envelope.content.decode(errors="replace").splitlines()
+                    if line.startswith("Subject:")
+                ),
+                "",
+            )
+            print(f"{envelope.rcpt_tos} {subject}")
+        return "250 Message accepted for delivery"
+
+    def recipients(self):
+        return [rcpt for envelope in self.messages for rcpt in envelope.rcpt_tos]
+
+
+def start_stub(stub, host="127.0.0.1", port=8025):
+    """Serve stub on a background thread; returns the aiosmtpd Controller (call .stop())."""
+    controller = Controller(stub, hostname=host, port=port)
+    controller.start()
+    return controller
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    stub = StubSMTP(verbose=True)
+    controller = start_stub(stub, port=args.port)
+    print(f"SMTP stub listening on 127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
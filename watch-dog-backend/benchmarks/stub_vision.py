@@ -0,0 +1,106 @@
+"""Local stand-in for the NVIDIA vision chat completions endpoint.
+
+Answers every request with a canned caption after a configurable latency and
+fails a configurable fraction of requests with 429/503, so the vision client
+can be exercised without network access. A configurable fraction of captions
+report unusual activity, which raises an alert. Standalone:
+
+    python -m benchmarks.stub_vision --port 8700 --latency 0.5 --error-rate 0.05
+
+then point the backend at it with VISION_API_URL=http://127.0.0.1:8700/chat/completions
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from aiohttp import web
+
+CANNED_CAPTION = {
+    "unusual_activity": "none",
+    "human_activity": "People walking on the sidewalk, some carrying bags.",
+    "animal_activity": "none",
+    "time": "day",
+    "unusual_crowd": "none",
+    "lighting_conditions": "well-lit",
+    "vehicle_details": "red sedan",
+    "number_of_individuals": "approximately 4",
+    "object_presence": "none",
+    "context_notes": "A typical urban street with light foot traffic.",
+}
+UNUSUAL_CAPTION = dict(CANNED_CAPTION, unusual_activity="Person climbing the fence.")
+
+
+class StubVision:
+    def __init__(self, latency=0.2, error_rate=0.0, seed=0, unusual_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unusual_rate = unusual_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.images = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request):
+        payload = await request.json()
+        self.requests += 1
+        self.images += max(1, str(payload["messages"][0]["content"]).count("<img"))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                status = self.random.choice([429, 503])
+                return web.Response(status=status, headers={"Retry-After": "0"})
+            return web.json_response(
+                {"choices": [{"message": {"content": self.reply(payload)}}]}
+            )
+        finally:
+            self.in_flight -= 1
+
+    def reply(self, payload):
+        # Batched requests carry several images and expect one report each
+        content = payload["messages"][0]["content"]
+        images = content.count("<img")
+        captions = [
+            UNUSUAL_CAPTION if self.random.random() < self.unusual_rate else CANNED_CAPTION
+            for _ in range(max(1, images))
+        ]
+        if images > 1:
+            return json.dumps(captions)
+        return json.dumps(captions[0])
+
+    def app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self.handle)
+        return app
+
+
+async def start_stub(stub, host="127.0.0.1", port=0):
+    """Serve stub on the running loop; returns (runner, url)."""
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--unusual-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubVision(
+        latency=args.latency, error_rate=args.error_rate, unusual_rate=args.unusual_rate
+    )
+    web.run_app(stub.app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
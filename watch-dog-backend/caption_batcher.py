@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from metrics import caption_batch_failures
+
+logger = logging.getLogger(__name__)
+
+# Most scene-change frames sent in one vision request (1 disables batching)
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", 1))
+# How long a partial batch may wait for more frames before it is sent
+CAPTION_BATCH_WAIT_MS = int(os.getenv("CAPTION_BATCH_WAIT_MS", 500))
+# Frames one camera may have waiting to be sent; past this the drop policy applies
+CAPTION_QUEUE_SIZE = int(os.getenv("CAPTION_QUEUE_SIZE", 16))
+# What a full queue gives up, one of DROP_POLICIES
+CAPTION_DROP_POLICY = os.getenv("CAPTION_DROP_POLICY", "drop-oldest")
+# Caption requests one camera may have outstanding at once
+CAPTION_CAMERA_IN_FLIGHT = int(os.getenv("CAPTION_CAMERA_IN_FLIGHT", 2))
+
+DROP_POLICIES = ("drop-oldest", "drop-newest", "keep-most-different", "coalesce-to-latest")
+
+
+class CameraQueue:
+    def __init__(self):
+        # (queued_at, frame), oldest first
+        self.frames = deque()
+        self.in_flight = 0
+        self.timer = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+
+class CaptionBatcher:
+    """Micro-batches scene-change frames per camera, with bounded queues.
+
+    A camera's frames are sent through handler(frames, camera_id) once
+    max_frames of them are queued, or max_wait_ms after the oldest one
+    arrived, whichever comes first. frames is a list of items given to
+    add(), in arrival order. Each camera has at most max_in_flight requests
+    outstanding and max_pending frames waiting, so while the vision API is
+    slow a camera holds at most max_pending + max_in_flight * max_frames
+    frames; policy decides what is dropped:
+
+    drop-oldest          when full, the oldest waiting frame
+    drop-newest          when full, the frame being added
+    keep-most-different  when full, the frame closest, by distance(a, b), to a neighbour
+    coalesce-to-latest   on every add, every waiting frame; only the new one is
+                         kept, so each request carries a camera's latest frame
+
+    Only call into the batcher from the event loop thread; ingest threads go
+    through loop.call_soon_threadsafe(batcher.add, ...).
+    """
+
+    def __init__(
+        self,
+        handler,
+        max_frames=CAPTION_BATCH_SIZE,
+        max_wait_ms=CAPTION_BATCH_WAIT_MS,
+        max_pending=CAPTION_QUEUE_SIZE,
+        policy=CAPTION_DROP_POLICY,
+        max_in_flight=CAPTION_CAMERA_IN_FLIGHT,
+        distance=None,
+    ):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(DROP_POLICIES)}")
+        if policy == "keep-most-different" and distance is None:
+            raise ValueError("keep-most-different needs a distance function")
+        self.handler = handler
+        self.max_frames = max(1, max_frames)
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max(1, max_pending)
+        self.policy = policy
+        self.max_in_flight = max(1, max_in_flight)
+        self.distance = distance
+        self.cameras = {}
+        self.tasks = set()
+        self.draining = False
+
+    def add(self, camera_id, frame):
+        queue = self.cameras.get(camera_id)
+        if queue is None:
+            queue = self.cameras[camera_id] = CameraQueue()
+        if self.policy == "coalesce-to-latest":
+            queue.dropped += len(queue.frames)
+            queue.frames.clear()
+        elif len(queue.frames) >= self.max_pending and not self._make_room(queue, frame):
+            return
+        queue.frames.append((time.monotonic(), frame))
+        self._send_due(camera_id)
+
+    def _make_room(self, queue, frame):
+        """Drop per the policy; False when the new frame is the one dropped."""
+        queue.dropped += 1
+        if self.policy == "drop-newest":
+            return False
+        if self.policy == "drop-oldest":
+            queue.frames.popleft()
+        else:
+            frames = [item for _, item in queue.frames] + [frame]
+            gaps = [self.distance(a, b) for a, b in zip(frames, frames[1:])]
+            # A frame is as redundant as it is close to its nearer neighbour
+            redundancy = [
+                min(gaps[max(0, i - 1)], gaps[min(i, len(gaps) - 1)])
+                for i in range(len(frames))
+            ]
+            drop = redundancy.index(min(redundancy))
+            if drop == len(frames) - 1:
+                return False
+            del queue.frames[drop]
+        return True
+
+    def _send_due(self, camera_id):
+        queue = self.cameras[camera_id]
+        while queue.frames and queue.in_flight < self.max_in_flight:
+            waited = time.monotonic() - queue.frames[0][0]
+            full = len(queue.frames) >= self.max_frames
+            if not (full or waited >= self.max_wait or self.draining):
+                if queue.timer is None:
+                    queue.timer = asyncio.get_running_loop().call_later(
+                        self.max_wait - waited, self._timer_fired, camera_id
+                    )
+                return
+            self._send(camera_id, queue)
+
+    def _timer_fired(self, camera_id):
+        self.cameras[camera_id].timer = None
+        self._send_due(camera_id)
+
+    def _send(self, camera_id, queue):
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+        count = min(self.max_frames, len(queue.frames))
+        batch = [queue.frames.popleft()[1] for _ in range(count)]
+        queue.in_flight += 1
+        queue.sent += len(batch)
+        task = asyncio.ensure_future(self.handler(batch, camera_id))
+        # Keep a reference until the request finishes so it isn't collected
+        self.tasks.add(task)
+        task.add_done_callback(lambda task: self._sent(camera_id, task))
+
+    def _sent(self, camera_id, task):
+        self.tasks.discard(task)
+        queue = self.cameras[camera_id]
+        queue.in_flight -= 1
+        # Retrieve the exception so a failed batch is logged and counted here
+        # rather than as "Task exception was never retrieved"
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            queue.failed += 1
+            caption_batch_failures.labels(camera_id).inc()
+            logger.error(
+                "caption batch failed: %s",
+                error,
+                exc_info=error,
+                extra={"camera_id": camera_id},
+            )
+        self._send_due(camera_id)
+
+    async def drain(self):
+        """Send every waiting frame and wait for all requests to finish."""
+        self.draining = True
+        try:
+            while True:
+                for camera_id in list(self.cameras):
+                    self._send_due(camera_id)
+                if not self.tasks:
+                    return
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            self.draining = False
+
+    def stats(self):
+        now = time.monotonic()
+        cameras = {}
+        for camera_id, queue in list(self.cameras.items()):
+            frames = list(queue.frames)
+            cameras[camera_id] = {
+                "depth": len(frames),
+                "in_flight": queue.in_flight,
+                "sent": queue.sent,
+                "dropped": queue.dropped,
+                "failed": queue.failed,
+                "oldest_age_s": round(now - frames[0][0], 3) if frames else 0.0,
+            }
+        return {
+            "policy": self.policy,
+            "max_pending": self.max_pending,
+            "depth": sum(c["depth"] for c in cameras.values()),
+            "dropped": sum(c["dropped"] for c in cameras.values()),
+            "failed": sum(c["failed"] for c in cameras.values()),
+            "oldest_age_s": max((c["oldest_age_s"] for c in cameras.values()), default=0.0),
+            "cameras": cameras,
+        }
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from scenedetect.detectors import HashDetector
+
+# Cached captions kept per camera (0 disables the cache)
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", 64))
+# Seconds a cached caption stays reusable
+CAPTION_CACHE_TTL = float(os.getenv("CAPTION_CACHE_TTL", 1800))
+# Most differing bits (out of 64) for two frames to count as the same scene
+CAPTION_CACHE_MAX_DISTANCE = int(os.getenv("CAPTION_CACHE_MAX_DISTANCE", 4))
+
+HASH_SIZE = 8
+HASH_LOWPASS = 4
+
+
+def frame_hash(frame):
+    """64-bit perceptual hash of a BGR frame, computed on a 32x32 downscale."""
+    side = HASH_SIZE * HASH_LOWPASS
+    small = cv2.resize(frame, (side, side), interpolation=cv2.INTER_AREA)
+    bits = HashDetector.hash_frame(small, HASH_SIZE, HASH_LOWPASS)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class CaptionCache:
+    """Per-camera LRU/TTL cache of caption outputs keyed by perceptual hash.
+
+    A lookup matches the most recently used entry whose hash is within
+    max_distance bits of the frame's hash, so a scene that flips back to a
+    state seen minutes ago reuses that caption instead of calling the API.
+    """
+
+    def __init__(
+        self,
+        max_entries=CAPTION_CACHE_SIZE,
+        ttl=CAPTION_CACHE_TTL,
+        max_distance=CAPTION_CACHE_MAX_DISTANCE,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, camera_id, frame_hash):
+        if self.max_entries <= 0:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entries = self.entries.get(camera_id)
+            if entries:
+                for key in reversed(entries):
+                    cached_at, caption = entries[key]
+                    if now - cached_at > self.ttl:
+                        continue
+                    if (key ^ frame_hash).bit_count() <= self.max_distance:
+                        entries.move_to_end(key)
+                        self.hits += 1
+                        return dict(caption)
+            self.misses += 1
+            return None
+
+    def put(self, camera_id, frame_hash, caption):
+        if self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        with self.lock:
+            entries = self.entries.setdefault(camera_id, OrderedDict())
+            entries[frame_hash] = (now, dict(caption))
+            entries.move_to_end(frame_hash)
+            # Hits reorder entries but keep their cached_at (the TTL counts from
+            # when the scene was captioned), so expired entries can be anywhere;
+            # sweep them all, then drop the least recently used past max_entries
+            expired = [
+                key for key, (cached_at, _) in entries.items() if now - cached_at > self.ttl
+            ]
+            for key in expired:
+                del entries[key]
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+            self.evictions += len(expired)
+
+    def clear(self, camera_id=None):
+        with self.lock:
+            if camera_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(camera_id, None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": sum(len(e) for e in self.entries.values()),
+            }
+
+
+caption_cache = CaptionCache()
@@ -0,0 +1,75 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Most captions written in one database transaction (1 = one per caption)
+CAPTION_WRITE_BATCH = int(os.getenv("CAPTION_WRITE_BATCH", 64))
+
+
+class CaptionWriter:
+    """Writes captions to the database on one background thread.
+
+    put() only enqueues, so neither the event loop nor an ingest thread waits
+    on the database. The writer takes whatever has queued up, up to max_batch
+    items, and passes it to handler(items) as one transaction: a lone caption
+    is written alone, and under load the batch grows, amortizing the commit.
+    """
+
+    def __init__(self, handler, max_batch=CAPTION_WRITE_BATCH):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.transactions = 0
+        self.largest_batch = 0
+
+    def put(self, item):
+        self._ensure_thread()
+        self.queue.put(item)
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="caption-writer", daemon=True
+                )
+                self.thread.start()
+                atexit.register(self.drain)
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.handler(items)
+                self.written += len(items)
+                self.transactions += 1
+                self.largest_batch = max(self.largest_batch, len(items))
+            except Exception as e:
+                logger.exception("writing %d captions failed: %s", len(items), e)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def drain(self):
+        """Block until every queued caption has been written."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "transactions": self.transactions,
+            "largest_batch": self.largest_batch,
+            "queued": self.queue.qsize(),
+        }
@@ -0,0 +1,112 @@
+import binascii
+import json
+import re
+
+CAPTION_MODEL = "meta/llama-3.2-90b-vision-instruct"
+
+CAPTION_FIELDS_PROMPT = "unusual_activity: Describe any unusual or suspicious activity observed, or respond with none if no such activity is detected. human_activity: Objectively describe human movements or behaviors observed in the footage, or respond with none if no human activity is detected. animal_activity: If any animals or birds are present, describe their movements or behaviors, or respond with none if no wildlife is detected. time: Specify whether the footage is captured during day or night based on lighting conditions. unusual_crowd: If there is an unusually large group of people, respond with unusual crowd, otherwise respond with none. lighting_conditions: Detail the lighting (e.g., well-lit, dim). vehicle_details: If vehicles are detected, describe them (e.g., red sedan). number_of_individuals: Provide the estimated number of people present (e.g., 3). object_presence: Describe any significant objects present (e.g., backpack left unattended). context_notes: Add any additional observations that provide context (e.g., event in progress)."
+
+CAPTION_PROMPT = f"Analyze this CCTV footage and generate an objective report in JSON format with the following fields: {CAPTION_FIELDS_PROMPT} The output should be in valid JSON format only no extra words."
+
+BATCH_CAPTION_PROMPT = "Analyze these {count} CCTV frames, given in order, and generate an objective report for each frame in JSON format with the following fields: {fields} The output should be a valid JSON array of exactly {count} reports, one per frame in the same order, only no extra words."
+
+
+def caption_prompt(count):
+    if count == 1:
+        return CAPTION_PROMPT
+    return BATCH_CAPTION_PROMPT.format(count=count, fields=CAPTION_FIELDS_PROMPT)
+
+
+def caption_payload(count, content):
+    return {
+        "model": CAPTION_MODEL,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": 512 * count,
+        "temperature": 0.4,
+        "top_p": 1.00,
+        "stream": False,
+    }
+
+
+def build_caption_payload(images_b64):
+    """Chat completion payload asking for one report per base64 image, in order."""
+    images = " ".join(
+        f'<img src="data:image/jpeg;base64,{image_b64}" />' for image_b64 in images_b64
+    )
+    return caption_payload(
+        len(images_b64), f"{caption_prompt(len(images_b64))} {images}"
+    )
+
+
+def json_fragment(text):
+    """text escaped for use inside a JSON string literal."""
+    return json.dumps(text)[1:-1].encode()
+
+
+IMAGES_MARKER = "\x00images\x00"
+IMAGE_OPEN = json_fragment('<img src="data:image/jpeg;base64,')
+IMAGE_CLOSE = json_fragment('" />')
+IMAGE_SEPARATOR = json_fragment(" ")
+# Raw bytes base64-encoded per chunk; a multiple of 3 so chunks join cleanly
+B64_CHUNK = 3 * 16 * 1024
+
+
+class CaptionRequestBody:
+    """JSON body of a caption request for JPEG-encoded frames, produced in chunks.
+
+    Same JSON as build_caption_payload, but the JPEG buffers are base64-encoded
+    chunk by chunk straight into the request stream, so no base64 string, no
+    prompt f-string and no serialized body are ever built in memory.
+    """
+
+    def __init__(self, images_jpeg):
+        self.images = [memoryview(image).cast("B") for image in images_jpeg]
+        payload = caption_payload(
+            len(self.images), f"{caption_prompt(len(self.images))} {IMAGES_MARKER}"
+        )
+        self.head, self.tail = json.dumps(payload).encode().split(
+            json_fragment(IMAGES_MARKER)
+        )
+
+    def __len__(self):
+        size = len(self.head) + len(self.tail)
+        size += len(IMAGE_SEPARATOR) * max(0, len(self.images) - 1)
+        for image in self.images:
+            size += len(IMAGE_OPEN) + 4 * ((image.nbytes + 2) // 3) + len(IMAGE_CLOSE)
+        return size
+
+    def __iter__(self):
+        yield self.head
+        for i, image in enumerate(self.images):
+            if i:
+                yield IMAGE_SEPARATOR
+            yield IMAGE_OPEN
+            for start in range(0, image.nbytes, B64_CHUNK):
+                yield binascii.b2a_base64(image[start : start + B64_CHUNK], newline=False)
+            yield IMAGE_CLOSE
+        yield self.tail
+
+    async def chunks(self):
+        for chunk in self:
+            yield chunk
+
+
+def clean_caption(cleaned_output):
+    numbers = re.findall(r"\d+", str(cleaned_output["number_of_individuals"]))
+    cleaned_output["number_of_individuals"] = int(numbers[0]) if numbers else 0
+    return cleaned_output
+
+
+def parse_caption_reply(json_response, count):
+    """Split a vision reply into `count` caption dicts.
+
+    Raises ValueError (json.JSONDecodeError included) when the reply doesn't
+    hold exactly one report per requested frame.
+    """
+    content = json_response["choices"][0]["message"]["content"]
+    reports = json.loads(content)
+    if isinstance(reports, dict):
+        reports = [reports]
+    if not isinstance(reports, list) or len(reports) != count:
+        raise ValueError(f"Expected {count} captions in the vision reply")
+    return [clean_caption(report) for report in reports]
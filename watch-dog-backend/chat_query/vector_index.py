@@ -0,0 +1,367 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vectors")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Transcripts handed to the chat model per question
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", 3))
+# Rows scored per matrix-vector product, bounding search memory
+SEARCH_BLOCK_ROWS = 65536
+
+# One row per embedded transcript, parallel to the rows of embeddings.f32
+ROW_DTYPE = np.dtype(
+    [("transcript_id", "<i8"), ("frame_number", "<i8"), ("created_at", "<f8")]
+)
+
+embedding_model = None
+embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    global embedding_model
+    with embedding_model_lock:
+        if embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+
+            embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        return embedding_model
+
+
+def embed(texts):
+    """Unit-length float32 embeddings, so cosine similarity is a dot product."""
+    return np.asarray(
+        get_embedding_model().encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        ),
+        dtype=np.float32,
+    )
+
+
+def split_context_notes(context_notes):
+    """(description, timestamp) packed into context_notes as "description; time: ..."."""
+    context_notes = (context_notes or "").split("; ")
+    description = context_notes[0] if len(context_notes) > 0 else ""
+    timestamp = context_notes[1].split(": ")[1] if len(context_notes) > 1 else ""
+    return description, timestamp
+
+
+def epoch(created_at):
+    return None if created_at is None else created_at.timestamp()
+
+
+class CameraVectorIndex:
+    """Transcript embeddings of one camera, appended as they are written.
+
+    embeddings.f32 is a row-major float32 matrix read through np.memmap and
+    rows.dat maps each matrix row back to its transcript id and frame number.
+    Both files are append-only; on load they are trimmed to the rows present
+    in both, so a crash mid-append only loses that append. synced.json holds
+    the transcript id VectorIndex.sync has indexed through. Rows keep their
+    real created_at; while they arrive in time order (the write path) row
+    order is time order, and once a backfill appends older rows a permutation
+    sorting them by created_at is kept in memory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.embeddings_path = os.path.join(directory, "embeddings.f32")
+        self.rows_path = os.path.join(directory, "rows.dat")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.synced_path = os.path.join(directory, "synced.json")
+        self.lock = threading.Lock()
+        self.dim = None
+        self.count = 0
+        self.transcript_ids = set()
+        # Every transcript id up to this one has been checked by sync();
+        # persisted so a restart doesn't rescan them
+        self.synced_through = 0
+        self.last_created_at = -np.inf
+        # Row positions in created_at order and their created_at, or None
+        # while row order is already time order
+        self.order = None
+        self.sorted_created_at = None
+        self.mapped = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta["model"] != EMBEDDING_MODEL:
+            logger.warning(
+                "vector index %s was built with %s; rebuild it", self.directory, meta["model"]
+            )
+            return
+        self.dim = meta["dim"]
+        row_bytes = self.dim * 4
+        count = min(
+            os.path.getsize(self.embeddings_path) // row_bytes,
+            os.path.getsize(self.rows_path) // ROW_DTYPE.itemsize,
+        )
+        os.truncate(self.embeddings_path, count * row_bytes)
+        os.truncate(self.rows_path, count * ROW_DTYPE.itemsize)
+        self.count = count
+        if count:
+            rows = np.fromfile(self.rows_path, dtype=ROW_DTYPE)
+            self.transcript_ids = set(rows["transcript_id"].tolist())
+            created_at = rows["created_at"]
+            self.last_created_at = float(created_at.max())
+            if np.any(np.diff(created_at) < 0):
+                self.order = np.argsort(created_at, kind="stable")
+                self.sorted_created_at = created_at[self.order]
+        # Written after the rows it covers, so it never runs ahead of them
+        if os.path.exists(self.synced_path):
+            with open(self.synced_path) as f:
+                self.synced_through = json.load(f)["synced_through"]
+
+    def add(self, items):
+        """Embed and append (transcript_id, frame_number, text, created_at) items not indexed yet.
+
+        created_at is epoch seconds, or None for now.
+        """
+        with self.lock:
+            items = [item for item in items if item[0] not in self.transcript_ids]
+            if not items:
+                return 0
+            now = time.time()
+            rows = np.empty(len(items), dtype=ROW_DTYPE)
+            rows["transcript_id"] = [item[0] for item in items]
+            rows["frame_number"] = [item[1] for item in items]
+            rows["created_at"] = [now if item[3] is None else item[3] for item in items]
+            self._append(embed(item[2] for item in items), rows)
+            return len(items)
+
+    def mark_synced(self, transcript_id):
+        """Record that every transcript id up to transcript_id is indexed."""
+        with self.lock:
+            if transcript_id <= self.synced_through:
+                return
+            self.synced_through = transcript_id
+            # Replaced whole, so a crash leaves the old watermark or the new one
+            temp_path = self.synced_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"synced_through": transcript_id}, f)
+            os.replace(temp_path, self.synced_path)
+
+    def append(self, embeddings, rows):
+        """Append precomputed unit-length embeddings and their ROW_DTYPE rows."""
+        with self.lock:
+            self._append(np.asarray(embeddings, dtype=np.float32), rows)
+
+    def _append(self, embeddings, rows):
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"model": EMBEDDING_MODEL, "dim": self.dim}, f)
+        self._sort(rows["created_at"])
+        # Embeddings first: a row entry never points past the matrix
+        with open(self.embeddings_path, "ab") as f:
+            f.write(embeddings.tobytes())
+        with open(self.rows_path, "ab") as f:
+            f.write(rows.tobytes())
+        self.count += len(rows)
+        self.transcript_ids.update(rows["transcript_id"].tolist())
+
+    def _sort(self, created_at):
+        """Fold the created_at of rows about to be appended into the time order."""
+        in_order = created_at[0] >= self.last_created_at and not np.any(np.diff(created_at) < 0)
+        if self.order is None and in_order:
+            self.last_created_at = float(created_at[-1])
+            return
+        if self.order is None:
+            self.order = np.arange(self.count)
+            self.sorted_created_at = np.fromfile(
+                self.rows_path, dtype=ROW_DTYPE, count=self.count
+            )["created_at"]
+        # Merge: each new row goes after the existing rows no newer than it
+        new_order = np.argsort(created_at, kind="stable")
+        new_created_at = created_at[new_order]
+        at = np.searchsorted(self.sorted_created_at, new_created_at, "right")
+        self.order = np.insert(self.order, at, new_order + self.count)
+        self.sorted_created_at = np.insert(self.sorted_created_at, at, new_created_at)
+        self.last_created_at = max(self.last_created_at, float(new_created_at[-1]))
+
+    def view(self):
+        """(embeddings, rows) as read-only memory maps over the indexed rows."""
+        with self.lock:
+            if not self.count:
+                return np.empty((0, self.dim or 0), np.float32), np.empty(0, ROW_DTYPE)
+            if self.mapped is None or self.mapped[0].shape[0] != self.count:
+                self.mapped = (
+                    np.memmap(
+                        self.embeddings_path,
+                        dtype=np.float32,
+                        mode="r",
+                        shape=(self.count, self.dim),
+                    ),
+                    np.memmap(
+                        self.rows_path, dtype=ROW_DTYPE, mode="r", shape=(self.count,)
+                    ),
+                )
+            return self.mapped
+
+    def search(self, query_embedding, k=CHAT_TOP_K, since=None, until=None):
+        """(scores, rows) of the k rows most similar to a unit-length query, best first.
+
+        since/until bound created_at (epoch seconds), found by binary search
+        over the rows in time order: while row order is time order the range
+        is a contiguous slice, otherwise the rows the permutation puts in it.
+        The range is scored block by block with one matrix-vector product
+        each, keeping each block's top k via argpartition.
+        """
+        embeddings, rows = self.view()
+        with self.lock:
+            order, created_at = self.order, self.sorted_created_at
+        if order is None:
+            created_at = rows["created_at"]
+        else:
+            # The order may already cover rows appended after view(); leave those out
+            in_view = order < len(rows)
+            order, created_at = order[in_view], created_at[in_view]
+        start = 0 if since is None else int(np.searchsorted(created_at, since, "left"))
+        stop = len(created_at) if until is None else int(np.searchsorted(created_at, until, "right"))
+        if order is not None:
+            # Ascending positions read the memory map front to back
+            positions = np.sort(order[start:stop])
+        best_scores, best_positions = [], []
+        for block in range(start, stop, SEARCH_BLOCK_ROWS):
+            end = min(block + SEARCH_BLOCK_ROWS, stop)
+            if order is None:
+                block_positions = np.arange(block, end)
+                scores = embeddings[block:end] @ query_embedding
+            else:
+                block_positions = positions[block - start : end - start]
+                scores = embeddings[block_positions] @ query_embedding
+            top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+            best_scores.append(scores[top])
+            best_positions.append(block_positions[top])
+        if not best_scores:
+            return np.empty(0, np.float32), np.empty(0, ROW_DTYPE)
+        scores = np.concatenate(best_scores)
+        positions = np.concatenate(best_positions)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return scores[order], np.asarray(rows[positions[order]])
+
+
+class VectorIndex:
+    """Per-camera transcript embedding indexes under VECTOR_INDEX_DIR/<camera_id>/."""
+
+    def __init__(self, root=VECTOR_INDEX_DIR):
+        self.root = root
+        self.cameras = {}
+        self.lock = threading.Lock()
+
+    def camera(self, camera_id):
+        with self.lock:
+            index = self.cameras.get(camera_id)
+            if index is None:
+                index = self.cameras[camera_id] = CameraVectorIndex(
+                    os.path.join(self.root, str(camera_id))
+                )
+            return index
+
+    def add_transcript(self, camera_id, transcript_id, frame_number, context_notes,
+                       created_at=None):
+        description, _ = split_context_notes(context_notes)
+        return self.camera(camera_id).add(
+            [(transcript_id, frame_number, description, epoch(created_at))]
+        )
+
+    def search(self, query, camera_ids, k=CHAT_TOP_K, since=None, until=None):
+        """The k transcripts across camera_ids most similar to the query text.
+
+        Returns dicts of camera_id, transcript_id, frame_number and score, best first.
+        """
+        query_embedding = embed([query])[0]
+        hits = []
+        for camera_id in camera_ids:
+            scores, rows = self.camera(camera_id).search(query_embedding, k, since, until)
+            hits.extend(
+                {
+                    "camera_id": camera_id,
+                    "transcript_id": int(row["transcript_id"]),
+                    "frame_number": int(row["frame_number"]),
+                    "score": float(score),
+                }
+                for score, row in zip(scores, rows)
+            )
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:k]
+
+    def sync(self, camera_id, batch_size=512, scan_size=10000):
+        """Index the camera's transcripts that aren't in its index yet.
+
+        Needs an app context. Covers rows written before the index existed,
+        rows backfilled out of order and any whose write-time embedding
+        failed. Transcript ids are scanned from the last one a sync checked,
+        kept in the index directory, so only rows written since are read,
+        across restarts too.
+        """
+        from db import TranscriptDetailed
+
+        index = self.camera(camera_id)
+        added = 0
+        while True:
+            ids = [
+                row.id
+                for row in TranscriptDetailed.query.with_entities(TranscriptDetailed.id)
+                .filter(
+                    TranscriptDetailed.camera_id == camera_id,
+                    TranscriptDetailed.id > index.synced_through,
+                )
+                .order_by(TranscriptDetailed.id)
+                .limit(scan_size)
+                .all()
+            ]
+            if not ids:
+                return added
+            missing = [i for i in ids if i not in index.transcript_ids]
+            for batch in range(0, len(missing), batch_size):
+                rows = (
+                    TranscriptDetailed.query.with_entities(
+                        TranscriptDetailed.id,
+                        TranscriptDetailed.frame_number,
+                        TranscriptDetailed.context_notes,
+                        TranscriptDetailed.created_at,
+                    )
+                    .filter(TranscriptDetailed.id.in_(missing[batch : batch + batch_size]))
+                    .all()
+                )
+                # Rows from before created_at existed sort first, at epoch 0
+                added += index.add(
+                    [
+                        (
+                            r.id,
+                            r.frame_number,
+                            split_context_notes(r.context_notes)[0],
+                            epoch(r.created_at) or 0.0,
+                        )
+                        for r in rows
+                    ]
+                )
+            # Only advanced once every id up to here is indexed
+            index.mark_synced(ids[-1])
+
+
+vector_index = VectorIndex()
+
+
+if __name__ == "__main__":
+    # Backfill: python -m chat_query.vector_index [camera_id ...]
+    from db import app, Camera
+
+    with app.app_context():
+        camera_ids = [int(c) for c in sys.argv[1:]] or [
+            c.id for c in Camera.query.all()
+        ]
+        for camera_id in camera_ids:
+            print(f"Camera {camera_id}: indexed {vector_index.sync(camera_id)} transcripts")
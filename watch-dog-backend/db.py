@@ -11,6 +11,20 @@ load_dotenv()
 
 db = SQLAlchemy()  # Instantiate the SQLAlchemy object
 
+# Activity fields and the boolean column recording that each one reports
+# something, so dashboard filters don't compare free text against "none"
+ACTIVITY_FLAGS = {
+    "unusual_activity": "unusual_activity_present",
+    "human_activity": "human_activity_present",
+    "animal_activity": "animal_activity_present",
+    "unusual_crowd": "unusual_crowd_present",
+}
+NONE_VALUES = ("none", "none.", "")
+
+
+def activity_present(value):
+    return str(value or "").strip().lower() not in NONE_VALUES
+
 
 class Camera(db.Model):
     __tablename__ = "cameras"
@@ -24,6 +38,8 @@ class Camera(db.Model):
     live = db.Column(db.Boolean, nullable=False)  # Live status
     url = db.Column(db.String, nullable=False)  # URL of the camera
     start_time = db.Column(db.DateTime, nullable=False)
+    # Frames per second run through scene detection; null uses SAMPLE_FPS
+    sample_fps = db.Column(db.Float, nullable=True)
 
     def __repr__(self):
         return f"<Camera {self.name}>"
@@ -76,6 +92,49 @@ class TranscriptDetailed(db.Model):
     context_notes = db.Column(
         db.Text
     )  # Additional context notes (e.g., "The scene appears to...")
+    created_at = db.Column(db.DateTime, default=datetime.now)  # When the row was written
+
+    # See ACTIVITY_FLAGS; NULL only on rows the migration hasn't backfilled
+    unusual_activity_present = db.Column(db.Boolean)
+    human_activity_present = db.Column(db.Boolean)
+    animal_activity_present = db.Column(db.Boolean)
+    unusual_crowd_present = db.Column(db.Boolean)
+
+    __table_args__ = (
+        # Per-camera listings page by id; keyframes are looked up by frame
+        db.Index("ix_transcripts_detailed_camera_id_id", "camera_id", "id"),
+        db.Index("ix_transcripts_detailed_camera_frame", "camera_id", "frame_number"),
+        db.Index("ix_transcripts_detailed_camera_created", "camera_id", "created_at"),
+        # Partial indexes over the few rows where an activity was seen
+        db.Index(
+            "ix_transcripts_detailed_unusual_activity",
+            "camera_id",
+            "id",
+            postgresql_where=unusual_activity_present.is_(True),
+            sqlite_where=unusual_activity_present.is_(True),
+        ),
+        db.Index(
+            "ix_transcripts_detailed_human_activity",
+            "camera_id",
+            "id",
+            postgresql_where=human_activity_present.is_(True),
+            sqlite_where=human_activity_present.is_(True),
+        ),
+        db.Index(
+            "ix_transcripts_detailed_animal_activity",
+            "camera_id",
+            "id",
+            postgresql_where=animal_activity_present.is_(True),
+            sqlite_where=animal_activity_present.is_(True),
+        ),
+        db.Index(
+            "ix_transcripts_detailed_unusual_crowd",
+            "camera_id",
+            "id",
+            postgresql_where=unusual_crowd_present.is_(True),
+            sqlite_where=unusual_crowd_present.is_(True),
+        ),
+    )
 
     # Define relationship (optional, depends on your schema)
     camera = db.relationship(
@@ -94,7 +153,23 @@ class AnalyticsData(db.Model):
     total_animal_incidents = db.Column(db.Integer, nullable=False)
     total_unusual_crowd_incidents = db.Column(db.Integer, nullable=False)
     total_vehicle_detected = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+
+class AnalyticsRollup(db.Model):
+    """Per-camera counters for one minute, hour or day bucket (see analytics.py)."""
+
+    __tablename__ = "analytics_rollups"
+
+    camera_id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), primary_key=True)  # minute, hour or day
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    total_footage_analyzed = db.Column(db.Integer, nullable=False)
+    total_individuals_detected = db.Column(db.Integer, nullable=False)
+    total_unusual_incidents = db.Column(db.Integer, nullable=False)
+    total_animal_incidents = db.Column(db.Integer, nullable=False)
+    total_unusual_crowd_incidents = db.Column(db.Integer, nullable=False)
+    total_vehicle_detected = db.Column(db.Integer, nullable=False)
 
 
 class Alert(db.Model):
@@ -107,7 +182,7 @@ class Alert(db.Model):
         db.Text, nullable=False
     )  # Detailed description of the alert
     timestamp = db.Column(
-        db.DateTime, default=datetime.now(), nullable=False
+        db.DateTime, default=datetime.now, nullable=False
     )  # When the alert was generated
     status = db.Column(
         db.Text, default="unacknowledged", nullable=False
@@ -116,6 +191,43 @@ class Alert(db.Model):
         db.Integer, nullable=False
     )  # Frame number associated with the alert
 
+    __table_args__ = (
+        db.Index("ix_alerts_camera_id_id", "camera_id", "id"),
+        db.Index("ix_alerts_camera_timestamp", "camera_id", "timestamp"),
+        db.Index(
+            "ix_alerts_unacknowledged",
+            "camera_id",
+            "id",
+            postgresql_where=status == "unacknowledged",
+            sqlite_where=status == "unacknowledged",
+        ),
+    )
+
+
+class AlertOutbox(db.Model):
+    """Alerts waiting to be emailed, written in the same transaction as the alert."""
+
+    __tablename__ = "alert_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    alert_id = db.Column(db.Integer, db.ForeignKey("alerts.id"), nullable=False)
+    camera_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    sent_at = db.Column(db.DateTime)  # NULL until emailed (or given up on)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+
+    alert = db.relationship("Alert")
+
+    __table_args__ = (
+        db.Index(
+            "ix_alert_outbox_pending",
+            "camera_id",
+            "id",
+            postgresql_where=sent_at.is_(None),
+            sqlite_where=sent_at.is_(None),
+        ),
+    )
+
 
 class Chats(db.Model):
     __tablename__ = "chats"
@@ -125,22 +237,44 @@ class Chats(db.Model):
     request = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    frames = db.Column(db.ARRAY(db.Integer))
+    frames = db.Column(db.ARRAY(db.Integer).with_variant(db.JSON, "sqlite"))
+
+    __table_args__ = (db.Index("ix_chats_camera_id_id", "camera_id", "id"),)
 
     def __repr__(self):
         return f"<Chat {self.id}: {self.request}>"
 
 
+def missing_schema(engine):
+    """Columns and indexes the models define that the database doesn't have yet.
+
+    create_all only creates missing tables; migrate.py upgrades existing ones.
+    """
+    inspector = db.inspect(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing += [f"{table.name}.{c.name}" for c in table.columns if c.name not in columns]
+        missing += [index.name for index in table.indexes if index.name not in indexes]
+    return missing
+
+
 def create_app():
     app = Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    CORS(app, origins=["*"])
+    CORS(app, origins=["*"], expose_headers=["X-Next-After-Id"])
 
     db.init_app(app)  # Initialize the database with the app
 
     with app.app_context():
         db.create_all()  # Create database tables
+        missing = missing_schema(db.engine)
+        if missing:
+            print(f"Database schema is behind the models ({', '.join(missing)}); run python migrate.py")
 
     return app
 
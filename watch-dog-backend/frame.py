@@ -1,38 +1,180 @@
 import cv2
 import numpy as np
+import os
 from scenedetect import SceneManager, FrameTimecode
 from scenedetect.detectors import HashDetector
-from vision import get_caption
+from vision import caption_writer, get_captions
 import asyncio
-from vision import ndarray_to_image_b64
+import itertools
+import logging
+from frame_encoder import FrameEncoder
+from scene_pool import (
+    DetectionDownscaler,
+    SceneHashDetector,
+    get_scene_pool,
+    new_scene_manager,
+)
+from frame_sampler import FrameSampler
+from caption_batcher import CaptionBatcher
+from caption_cache import caption_cache, frame_hash
+from frame_store import frame_store
+from metrics import captions_reused, encode_seconds, frames_detected, scene_changes
+from tracing import tracer
 
-# Initialize SceneManager and ContentDetector globally
-scene_manager = SceneManager()
-scene_manager.add_detector(HashDetector(threshold=0.03))
+logger = logging.getLogger(__name__)
 
-# Maintain a global frame counter to track which frame is being processed
-frame_number = 0
+# "inline" runs HashDetector on the ingest thread, "pool" in worker processes.
+# Keep inline: on the downscaled input, pool mode is slower (see README)
+SCENE_DETECTION_MODE = os.getenv("SCENE_DETECTION_MODE", "inline")
 
-# Define video FPS (frames per second) - adjust FPS to match your video source.
-VIDEO_FPS = 30  # Example FPS, replace with actual FPS if known
+# Restarting a camera gets a fresh pool stream id, so the old run can be
+# released without touching the new one.
+stream_ids = itertools.count(1)
 
 
-def process_a_frame(frame, loop, camera_id):
-    global frame_number
-    frame_number += 1
+async def caption_frames(frames, camera_id):
+    """Caption a batch of (frame_number, image_jpeg, frame_hash) and cache the results."""
+    captions = await get_captions(
+        [(frame_number, image_jpeg) for frame_number, image_jpeg, _ in frames], camera_id
+    )
+    for (frame_number, image_jpeg, hash_), cleaned_output in zip(frames, captions):
+        if cleaned_output:
+            caption_cache.put(camera_id, hash_, cleaned_output)
+            # Keep the keyframe so chat can show it next to the transcript
+            await asyncio.to_thread(frame_store.put, camera_id, frame_number, image_jpeg)
+    return captions
 
-    # Use the internal _process_frame to process the current frame
-    new_scene_detected = scene_manager._process_frame(frame_number, frame)
+
+def save_cached_caption(cached_output, frame_number, camera_id, image_jpeg):
+    caption_writer.put((cached_output, frame_number, camera_id))
+    frame_store.put(camera_id, frame_number, image_jpeg)
+
+
+# Groups scene changes per camera into multi-image caption requests; frames
+# are (frame_number, image_jpeg, frame_hash), compared by hash for the
+# keep-most-different drop policy
+caption_batcher = CaptionBatcher(
+    caption_frames, distance=lambda a, b: (a[2] ^ b[2]).bit_count()
+)
+
+
+class SceneState:
+    """Scene detection state for one camera (replaces the old module globals)."""
+
+    def __init__(self, camera_id, mode=SCENE_DETECTION_MODE, sample_fps=None):
+        self.camera_id = camera_id
+        # In pool mode the SceneManager lives in a scene_pool worker process
+        self.scene_pool = get_scene_pool() if mode == "pool" else None
+        self.detector = SceneHashDetector() if self.scene_pool is None else None
+        self.scene_manager = (
+            new_scene_manager(self.detector) if self.scene_pool is None else None
+        )
+        self.stream_id = next(stream_ids)
+        # Small grayscale copy of each frame that detection runs on
+        self.downscaler = DetectionDownscaler()
+        # Picks the decoded frames that reach scene detection
+        self.sampler = FrameSampler(sample_fps)
+        self.frames_processed = 0
+        self.scenes_detected = 0
+        # This camera's metric series, looked up once instead of per frame
+        self.frames_detected = frames_detected.labels(camera_id)
+        self.scene_changes = scene_changes.labels(camera_id)
+        # Remembers the JPEG quality that fits this camera's frames
+        self.encoder = FrameEncoder()
+        # Frame counter to track which frame of this camera is being processed.
+        # It continues after the last stored keyframe so a restarted stream
+        # doesn't reuse frame numbers already in transcripts and the frame store.
+        self.frame_number = frame_store.last_frame_number(camera_id)
+
+    def sample(self):
+        """Number the next decoded frame; returns the number if it should be detected."""
+        self.frame_number += 1
+        return self.frame_number if self.sampler.sample() else None
+
+    def distance(self):
+        """Hash distance of the latest detected frame (one frame behind in pool mode)."""
+        if self.scene_pool is not None:
+            return self.scene_pool.distance(self.stream_id)
+        return self.detector.distance
+
+    def stats(self):
+        return dict(
+            self.sampler.stats(),
+            frames_processed=self.frames_processed,
+            scenes_detected=self.scenes_detected,
+        )
+
+    def close(self):
+        if self.scene_pool is not None:
+            self.scene_pool.release(self.stream_id)
+
+
+def process_a_frame(frame, frame_number, loop, state):
+    state.frames_processed += 1
+    state.frames_detected.inc()
+    with tracer.frame_span("detect", state.camera_id, frame_number) as span:
+        # Detection only sees the small grayscale image; the full frame is kept
+        # for captioning
+        detect_frame = state.downscaler.prepare(frame)
+
+        if state.scene_pool is not None:
+            # The span only covers handing the frame to the pool
+            span.set(mode="pool")
+            state.scene_pool.submit(
+                state.stream_id,
+                frame_number,
+                frame,
+                lambda n, f: on_scene_change(f, n, loop, state),
+                detect_frame,
+            )
+            state.sampler.observe(state.distance())
+            return
+
+        # Use the internal _process_frame to process the current frame
+        new_scene_detected = state.scene_manager._process_frame(frame_number, detect_frame)
+        state.sampler.observe(state.distance())
+        span.set(scene_change=bool(new_scene_detected))
 
     # Check if a scene change was detected
     if new_scene_detected:
-        print(f"Scene change detected at frame {frame_number})")
+        on_scene_change(frame, frame_number, loop, state)
+
 
-        # Compress the image (e.g., reduce quality to 80%)
+def on_scene_change(frame, frame_number, loop, state):
+    camera_id = state.camera_id
+    state.scenes_detected += 1
+    state.scene_changes.inc()
+    fields = {"camera_id": camera_id, "frame_number": frame_number}
+    logger.debug("scene change", extra=fields)
+
+    # A near-identical scene was captioned recently: reuse it, skip the API
+    hash_ = frame_hash(frame)
+    cached_output = caption_cache.get(camera_id, hash_)
+
+    # Downsize and compress the image to fit the vision API upload limit
+    with encode_seconds.time(), tracer.frame_span("encode", camera_id, frame_number) as span:
+        image_jpeg = state.encoder.encode(frame)
+        span.set(
+            bytes=image_jpeg.nbytes,
+            quality=state.encoder.quality,
+            cached_caption=cached_output is not None,
+        )
+
+    if cached_output is not None:
         asyncio.run_coroutine_threadsafe(
-            get_caption(ndarray_to_image_b64(frame), frame_number, camera_id), loop
+            asyncio.to_thread(
+                save_cached_caption, cached_output, frame_number, camera_id, image_jpeg
+            ),
+            loop,
         )
-        print(f"Caption for frame {frame_number}")
+        captions_reused.labels(camera_id).inc()
+        logger.debug("cached caption reused", extra=fields)
+        return
+
+    loop.call_soon_threadsafe(
+        caption_batcher.add, camera_id, (frame_number, image_jpeg, hash_)
+    )
+    logger.debug("caption queued", extra=fields)
 
 
 def test_process_image(image_path):
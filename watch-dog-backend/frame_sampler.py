@@ -0,0 +1,89 @@
+import math
+import os
+
+# Frames per second a camera runs through scene detection, unless the camera sets sample_fps
+SAMPLE_FPS = float(os.getenv("SAMPLE_FPS", 5))
+# Bounds of the adaptive rate: idle scenes fall to the minimum, motion climbs to the maximum
+SAMPLE_FPS_MIN = float(os.getenv("SAMPLE_FPS_MIN", 1))
+SAMPLE_FPS_MAX = float(os.getenv("SAMPLE_FPS_MAX", 15))
+# Hash distance between sampled frames that counts as motion, as the fraction
+# of the 64 hash bits that differ (one bit is 1/64 = 0.0156). Two bits, so a
+# single bit flipped by sensor noise doesn't hold the rate up.
+MOTION_DISTANCE = float(os.getenv("MOTION_DISTANCE", 2 / 64))
+# Seconds without motion before the rate is halved
+SAMPLE_IDLE_SECONDS = float(os.getenv("SAMPLE_IDLE_SECONDS", 5))
+# Assumed when the stream doesn't report its frame rate
+DEFAULT_SOURCE_FPS = 30.0
+
+
+class FrameSampler:
+    """Chooses which decoded frames of one camera go through scene detection.
+
+    Frames are picked evenly at rate frames per second of stream time, using
+    the stream's reported FPS. observe() feeds back the hash distance of each
+    sampled frame: motion restores at least sample_fps and doubles the rate
+    from there (up to max_fps, or sample_fps when that is higher), and every
+    idle_seconds without motion halve it (down to min_fps).
+    """
+
+    def __init__(
+        self,
+        sample_fps=SAMPLE_FPS,
+        min_fps=SAMPLE_FPS_MIN,
+        max_fps=SAMPLE_FPS_MAX,
+        motion_distance=MOTION_DISTANCE,
+        idle_seconds=SAMPLE_IDLE_SECONDS,
+    ):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.motion_distance = motion_distance
+        self.idle_seconds = idle_seconds
+        self.source_fps = DEFAULT_SOURCE_FPS
+        self.set_sample_fps(sample_fps)
+        # Starts full so the first frame is always sampled
+        self.credit = 1.0
+        self.decoded = 0
+        self.sampled = 0
+        self.quiet_since = 0
+
+    def set_source_fps(self, fps):
+        if fps and math.isfinite(fps) and fps > 0:
+            self.source_fps = float(fps)
+        self.set_sample_fps(self.sample_fps)
+
+    def set_sample_fps(self, sample_fps):
+        self.sample_fps = sample_fps or SAMPLE_FPS
+        self.rate = min(max(self.sample_fps, self.min_fps), self.source_fps)
+
+    def sample(self):
+        """Count a decoded frame; True when it should be scene-detected."""
+        self.decoded += 1
+        self.credit += self.rate / self.source_fps
+        if self.credit < 1:
+            return False
+        # Never bank more than one frame, so a rate change doesn't cause a burst
+        self.credit = min(self.credit - 1, 1.0)
+        self.sampled += 1
+        return True
+
+    def observe(self, distance):
+        """Adapt the rate to the hash distance of the latest sampled frame."""
+        if distance >= self.motion_distance:
+            self.rate = min(
+                max(self.rate * 2, self.sample_fps),
+                max(self.max_fps, self.sample_fps),
+                self.source_fps,
+            )
+            self.quiet_since = self.decoded
+        elif (self.decoded - self.quiet_since) / self.source_fps >= self.idle_seconds:
+            self.rate = max(self.rate / 2, min(self.min_fps, self.source_fps))
+            self.quiet_since = self.decoded
+
+    def stats(self):
+        return {
+            "source_fps": self.source_fps,
+            "sample_fps": self.sample_fps,
+            "current_fps": round(self.rate, 2),
+            "frames_decoded": self.decoded,
+            "frames_sampled": self.sampled,
+        }
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from urllib.parse import parse_qs
+import cv2
+from vidgear.gears import CamGear
+
+OPENCV_SCHEMES = ("rtsp://", "rtsps://", "rtmp://")
+# JPEG quality replay clips are held in memory at
+REPLAY_JPEG_QUALITY = 90
+# Most memory one replay clip's JPEGs may take; longer recordings are
+# refused (file:// URLs stream from disk instead)
+REPLAY_MAX_CLIP_MB = int(os.getenv("REPLAY_MAX_CLIP_MB", 256))
+
+
+class CamGearSource:
+    """vidgear CamGear in stream mode (YouTube and other web streams)."""
+
+    def __init__(self, url):
+        self.url = url
+        self.stream = None
+        self.framerate = 0.0
+
+    def start(self):
+        self.stream = CamGear(source=self.url, stream_mode=True, logging=True).start()
+        self.framerate = self.stream.framerate
+        return self
+
+    def read(self):
+        return self.stream.read()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+
+
+class OpenCVSource:
+    """cv2.VideoCapture on a network stream, read as fast as it delivers."""
+
+    def __init__(self, url):
+        self.url = url
+        self.capture = None
+        self.framerate = 0.0
+        # Held while reading so stop() never releases a capture mid-read
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.url)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open {self.url}")
+        self.framerate = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        return self
+
+    def read(self):
+        with self.lock:
+            if self.capture is None:
+                return None
+            ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def stop(self):
+        with self.lock:
+            capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.release()
+
+
+class Pacer:
+    """Sleeps so frame i is delivered at i / (framerate * speed) seconds."""
+
+    def __init__(self, framerate, speed, stopped):
+        self.interval = 1 / (framerate * speed) if framerate and speed else 0.0
+        self.stopped = stopped
+        self.started = None
+        self.delivered = 0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+        due = self.started + self.delivered * self.interval
+        if due > now:
+            self.stopped.wait(due - now)
+        self.delivered += 1
+
+
+class FileSource(OpenCVSource):
+    """A local video file, decoded as it plays, paced at speed times real time."""
+
+    def __init__(self, path, speed=1.0, loop=False):
+        super().__init__(path)
+        self.speed = speed
+        self.loop = loop
+        self.stopped = threading.Event()
+        self.pacer = None
+
+    def start(self):
+        super().start()
+        self.pacer = Pacer(self.framerate, self.speed, self.stopped)
+        return self
+
+    def read(self):
+        frame = super().read()
+        if frame is None and self.loop and not self.stopped.is_set():
+            with self.lock:
+                if self.capture is not None:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            frame = super().read()
+        if frame is not None:
+            self.pacer.wait()
+        return None if self.stopped.is_set() else frame
+
+    def stop(self):
+        self.stopped.set()
+        super().stop()
+
+
+class RecordedClip:
+    """A video file decoded once and kept as JPEGs, for any number of replays.
+
+    Raises ValueError once the JPEGs pass max_bytes (REPLAY_MAX_CLIP_MB), so
+    a long recording can't exhaust the ingest host's memory.
+    """
+
+    def __init__(self, path, max_frames=None, max_bytes=REPLAY_MAX_CLIP_MB * 2**20):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"Could not open {path}")
+        self.framerate = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.jpegs = []
+        self.nbytes = 0
+        try:
+            while max_frames is None or len(self.jpegs) < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                _, buffer = cv2.imencode(
+                    ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), REPLAY_JPEG_QUALITY]
+                )
+                self.nbytes += buffer.nbytes
+                if self.nbytes > max_bytes:
+                    raise ValueError(
+                        f"{path} is over the {max_bytes // 2**20} MB replay limit "
+                        f"(REPLAY_MAX_CLIP_MB); use a shorter clip or a file:// URL"
+                    )
+                self.jpegs.append(buffer)
+        finally:
+            capture.release()
+        if not self.jpegs:
+            raise ValueError(f"No frames in {path}")
+
+    def decode(self, index):
+        return cv2.imdecode(self.jpegs[index], cv2.IMREAD_COLOR)
+
+
+clips = {}
+clips_lock = threading.Lock()
+
+
+def recorded_clip(path):
+    """The shared RecordedClip of path, loaded on first use."""
+    path = os.path.abspath(path)
+    with clips_lock:
+        clip = clips.get(path)
+        if clip is None:
+            clip = clips[path] = RecordedClip(path)
+        return clip
+
+
+class ReplaySource:
+    """Replays a RecordedClip at speed times real time, as one virtual camera.
+
+    The clip is held in memory once for all virtual cameras replaying it,
+    with no file or network I/O; each frame is still decoded from JPEG, so
+    ingest costs about what a real stream does. offset starts the replay
+    that many frames in, so cameras replaying one clip don't cut scenes in
+    lockstep.
+    """
+
+    def __init__(self, clip, speed=1.0, loop=True, offset=0):
+        self.clip = clip
+        self.framerate = clip.framerate
+        self.speed = speed
+        self.loop = loop
+        self.position = offset % len(clip.jpegs)
+        self.stopped = threading.Event()
+        self.pacer = Pacer(self.framerate, speed, self.stopped)
+
+    def start(self):
+        return self
+
+    def read(self):
+        if self.position >= len(self.clip.jpegs):
+            if not self.loop:
+                return None
+            self.position = 0
+        self.pacer.wait()
+        if self.stopped.is_set():
+            return None
+        frame = self.clip.decode(self.position)
+        self.position += 1
+        return frame
+
+    def stop(self):
+        self.stopped.set()
+
+
+def url_options(url, loop):
+    path, _, query = url.partition("?")
+    options = {key: values[-1] for key, values in parse_qs(query).items()}
+    return {
+        "path": path,
+        "speed": float(options.get("speed", 1)),
+        "loop": options.get("loop", str(loop)).lower() in ("1", "true"),
+        "offset": int(options.get("offset", 0)),
+    }
+
+
+def open_source(url):
+    """A not yet started frame source for a camera URL.
+
+    Every source has CamGear's interface: start() returns the source, read()
+    the next BGR frame or None once the stream has ended, stop() releases it
+    (from any thread) and framerate is the stream's fps (0 when unknown).
+
+        rtsp://, rtsps://, rtmp://       OpenCVSource
+        file:///clip.mp4 or a file path  FileSource, at the file's frame rate
+        replay:///clip.mp4               ReplaySource of the clip, looping
+        anything else                    CamGearSource (YouTube, web streams)
+
+    file and replay URLs take ?speed= (times real time, 0 for unpaced) and
+    ?loop=0/1; replay also takes ?offset= (first frame).
+    """
+    if url.startswith(OPENCV_SCHEMES):
+        return OpenCVSource(url)
+    if url.startswith("replay://"):
+        options = url_options(url[len("replay://") :], loop=True)
+        return ReplaySource(
+            recorded_clip(options["path"]), options["speed"], options["loop"], options["offset"]
+        )
+    if url.startswith("file://"):
+        options = url_options(url[len("file://") :], loop=False)
+        return FileSource(options["path"], options["speed"], options["loop"])
+    if os.path.isfile(url):
+        return FileSource(url)
+    return CamGearSource(url)
@@ -0,0 +1,244 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+FRAME_STORE_DIR = os.getenv("FRAME_STORE_DIR", "./frames")
+# A segment file is closed and a new one started past this size
+FRAME_SEGMENT_BYTES = int(os.getenv("FRAME_SEGMENT_BYTES", 64 * 1024 * 1024))
+# Per-camera retention: oldest segments are evicted past either limit
+FRAME_STORE_MAX_BYTES = int(os.getenv("FRAME_STORE_MAX_BYTES", 2 * 1024**3))
+FRAME_STORE_MAX_AGE = float(os.getenv("FRAME_STORE_MAX_AGE", 7 * 24 * 3600))
+
+# frame_number, segment, offset, length, created_at
+INDEX_RECORD = struct.Struct("<qIQId")
+
+
+class FrameReader:
+    """File-like view of exactly one frame's bytes inside a segment file.
+
+    For wsgi.file_wrapper, which reads until EOF: reads stop at the end of
+    the frame instead of running on into the next one.
+    """
+
+    def __init__(self, path, offset, length):
+        self.file = open(path, "rb")
+        self.file.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class CameraFrameStore:
+    """Keyframes of one camera in append-only segment files plus an index.
+
+    seg-000001.dat, seg-000002.dat, ... hold the JPEGs back to back and
+    index.dat holds one fixed-size record per frame, so a camera costs a
+    handful of files instead of one per keyframe. Reads go through a cached
+    mmap of the segment. Retention drops whole segments, oldest first.
+    """
+
+    def __init__(self, directory, segment_bytes, max_bytes, max_age):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.records = {}
+        # segment -> [bytes, newest created_at]
+        self.segments = {}
+        self.maps = {}
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"seg-{segment:06d}.dat")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, "index.dat")
+
+    def _load(self):
+        for name in os.listdir(self.directory):
+            if name.startswith("seg-") and name.endswith(".dat"):
+                segment = int(name[4:-4])
+                self.segments[segment] = [os.path.getsize(self.segment_path(segment)), 0]
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_RECORD.size
+            for record in INDEX_RECORD.iter_unpack(data[:usable]):
+                frame_number, segment, offset, length, created_at = record
+                info = self.segments.get(segment)
+                # Skip records whose data didn't make it to disk (crash mid-write)
+                if info is None or offset + length > info[0]:
+                    continue
+                self.records[frame_number] = record
+                info[1] = max(info[1], created_at)
+        self.index = open(self.index_path, "ab")
+        self.active = max(self.segments, default=0)
+
+    def _writer_for(self, length):
+        size = self.segments.get(self.active, [0, 0])[0]
+        if size and size + length > self.segment_bytes:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self.active += 1
+        if self.writer is None:
+            self.writer = open(self.segment_path(self.active), "ab")
+            self.segments.setdefault(self.active, [0, 0])
+        return self.writer
+
+    def put(self, frame_number, image_jpeg):
+        """Store a keyframe once; a frame number already stored is left alone."""
+        data = memoryview(image_jpeg).cast("B")
+        with self.lock:
+            if frame_number in self.records:
+                return False
+            writer = self._writer_for(data.nbytes)
+            info = self.segments[self.active]
+            offset = info[0]
+            writer.write(data)
+            writer.flush()
+            created_at = time.time()
+            record = (frame_number, self.active, offset, data.nbytes, created_at)
+            self.index.write(INDEX_RECORD.pack(*record))
+            self.index.flush()
+            info[0] += data.nbytes
+            info[1] = created_at
+            self.records[frame_number] = record
+            self._evict()
+            return True
+
+    def locate(self, frame_number):
+        """(path, offset, length, created_at) of a stored frame, or None."""
+        with self.lock:
+            record = self.records.get(frame_number)
+        if record is None:
+            return None
+        _, segment, offset, length, created_at = record
+        return self.segment_path(segment), offset, length, created_at
+
+    def get(self, frame_number):
+        with self.lock:
+            record = self.records.get(frame_number)
+            if record is None:
+                return None
+            _, segment, offset, length, _ = record
+            mapped = self.maps.get(segment)
+            if mapped is None or len(mapped) < offset + length:
+                if mapped is not None:
+                    mapped.close()
+                with open(self.segment_path(segment), "rb") as f:
+                    mapped = self.maps[segment] = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+            return mapped[offset : offset + length]
+
+    def last_frame_number(self):
+        with self.lock:
+            return max(self.records, default=0)
+
+    def total_bytes(self):
+        return sum(info[0] for info in self.segments.values())
+
+    def _evict(self):
+        now = time.time()
+        evicted = False
+        while len(self.segments) > 1:
+            oldest = min(self.segments)
+            size, newest = self.segments[oldest]
+            if self.total_bytes() <= self.max_bytes and now - newest <= self.max_age:
+                break
+            del self.segments[oldest]
+            mapped = self.maps.pop(oldest, None)
+            if mapped is not None:
+                mapped.close()
+            os.remove(self.segment_path(oldest))
+            evicted = True
+        if evicted:
+            self.records = {
+                n: r for n, r in self.records.items() if r[1] in self.segments
+            }
+            self._rewrite_index()
+
+    def _rewrite_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for record in self.records.values():
+                f.write(INDEX_RECORD.pack(*record))
+        self.index.close()
+        os.replace(tmp_path, self.index_path)
+        self.index = open(self.index_path, "ab")
+
+    def close(self):
+        with self.lock:
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps.clear()
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self.index.close()
+
+
+class FrameStore:
+    """Captioned keyframes for every camera, under FRAME_STORE_DIR/<camera_id>/."""
+
+    def __init__(
+        self,
+        root=FRAME_STORE_DIR,
+        segment_bytes=FRAME_SEGMENT_BYTES,
+        max_bytes=FRAME_STORE_MAX_BYTES,
+        max_age=FRAME_STORE_MAX_AGE,
+    ):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.cameras = {}
+        self.lock = threading.Lock()
+
+    def camera(self, camera_id):
+        with self.lock:
+            store = self.cameras.get(camera_id)
+            if store is None:
+                store = self.cameras[camera_id] = CameraFrameStore(
+                    os.path.join(self.root, str(camera_id)),
+                    self.segment_bytes,
+                    self.max_bytes,
+                    self.max_age,
+                )
+            return store
+
+    def put(self, camera_id, frame_number, image_jpeg):
+        return self.camera(camera_id).put(frame_number, image_jpeg)
+
+    def get(self, camera_id, frame_number):
+        return self.camera(camera_id).get(frame_number)
+
+    def locate(self, camera_id, frame_number):
+        return self.camera(camera_id).locate(frame_number)
+
+    def last_frame_number(self, camera_id):
+        return self.camera(camera_id).last_frame_number()
+
+    def close(self):
+        with self.lock:
+            for store in self.cameras.values():
+                store.close()
+            self.cameras.clear()
+
+
+frame_store = FrameStore()
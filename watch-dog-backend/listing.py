@@ -0,0 +1,100 @@
+import os
+from datetime import datetime
+from flask import Response, current_app, stream_with_context
+from db import db
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", 5000))
+# Rows fetched per round trip from the server-side cursor
+LIST_STREAM_BATCH = int(os.getenv("LIST_STREAM_BATCH", 1000))
+
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 string, as a naive local datetime."""
+    try:
+        return datetime.fromtimestamp(float(value))
+    except (ValueError, OverflowError, OSError):
+        # Not a number, or one outside the platform's time range
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def list_params(args, fields, default_fields=None):
+    """Listing options from the query string; raises ValueError on bad input.
+
+    ?after_id=<id>&limit=<n> page by key, ?since=&until= bound the time column,
+    ?fields=a,b select columns and ?format=ndjson streams one row per line.
+    """
+    after_id = args.get("after_id", type=int)
+    limit = args.get("limit", type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    selected = default_fields or fields
+    if args.get("fields"):
+        selected = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = set(selected) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    output_format = args.get("format", "json")
+    if output_format not in ("json", "ndjson"):
+        raise ValueError("format must be json or ndjson")
+    return {
+        "after_id": after_id,
+        "limit": limit,
+        "since": parse_time(args["since"]) if args.get("since") else None,
+        "until": parse_time(args["until"]) if args.get("until") else None,
+        "fields": selected,
+        "ndjson": output_format == "ndjson",
+    }
+
+
+def keyset_select(model, key, fields, where=(), after_id=None, limit=None,
+                  time_column=None, since=None, until=None):
+    """SELECT of key plus `fields` of model, ordered by key, starting after after_id."""
+    columns = [key] + [getattr(model, f) for f in fields if f != key.key]
+    query = db.select(*columns).where(*where)
+    if after_id is not None:
+        query = query.where(key > after_id)
+    if time_column is not None and since is not None:
+        query = query.where(time_column >= since)
+    if time_column is not None and until is not None:
+        query = query.where(time_column <= until)
+    query = query.order_by(key)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def json_array(lines):
+    yield "["
+    for i, line in enumerate(lines):
+        yield line if i == 0 else "," + line
+    yield "]"
+
+
+def list_response(query, key_name, params):
+    """Stream the rows of a keyset_select as a JSON array or NDJSON, per list_params.
+
+    Rows are serialized one at a time off a server-side cursor, so memory
+    stays flat however many rows match. A limited page is small and is read
+    up front to set X-Next-After-Id when more rows may follow.
+    """
+    rows = db.session.execute(
+        query.execution_options(yield_per=LIST_STREAM_BATCH)
+    ).mappings()
+    headers = {}
+    if params["limit"] is not None:
+        rows = rows.all()
+        if len(rows) == params["limit"]:
+            headers["X-Next-After-Id"] = str(rows[-1][key_name])
+    dumps = current_app.json.dumps
+    if params["ndjson"]:
+        body = (dumps(dict(row)) + "\n" for row in rows)
+        mimetype = "application/x-ndjson"
+    else:
+        body = json_array(dumps(dict(row)) for row in rows)
+        mimetype = "application/json"
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
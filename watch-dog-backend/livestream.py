@@ -4,7 +4,7 @@ import os
 import time
 import csv
 from datetime import datetime
-from vidgear.gears import CamGear
+from frame_source import open_source
 from PIL import Image
 
 
@@ -22,8 +22,8 @@ def capture_keyframes_and_log(
             writer = csv.writer(file)
             writer.writerow(["Image", "Timestamp"])
 
-    # Start video stream from the YouTube live stream link
-    stream = CamGear(source=stream_url, stream_mode=True, logging=True).start()
+    # Start video stream from the YouTube live stream link (or any frame source URL)
+    stream = open_source(stream_url).start()
 
     # Get start time
     start_time = time.time()
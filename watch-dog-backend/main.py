@@ -1,116 +1,137 @@
-import asyncio
 from flask import Flask, request, jsonify, make_response, current_app
-import threading
-import time
-from vidgear.gears import CamGear
-from frame import process_a_frame, test_process_image
+from functools import lru_cache
 import cv2
+import numpy as np
+from frame import caption_batcher, test_process_image
 from flask_sqlalchemy import SQLAlchemy
-from vision import get_caption, image_path_to_image_b64
+from vision import get_caption
 import os
 import base64
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from db import Camera, TranscriptDetailed, Alert, AnalyticsData, Chats
 from chat_query.chat_online import get_response_online
+from chat_query.vector_index import CHAT_TOP_K
+from supervisor import supervisor
+from caption_cache import caption_cache
+from frame_store import FrameReader, frame_store
+from preview import BOUNDARY, previews
+from transcript_repository import TRANSCRIPT_FIELDS, transcripts_select
+from listing import keyset_select, list_params, list_response, parse_time
+from analytics import rollups
+import metrics
+from logs import configure_logging
 
 # Load environment variables from .env file
 
 
-# Global Variables
-stream = None
-stream_url = None
-streaming_thread = None
-stream_running = False
-stream_lock = threading.Lock()
-display_frame = True
 from db import db, app
+from alert_dispatcher import alert_dispatcher
 
+configure_logging()
 
-def start_stream(url, camera_id):
-    """Function to start the YouTube stream."""
-    global stream, stream_running, display_frame
-
-    def run_event_loop(loop):
-        asyncio.set_event_loop(loop)
-        loop.run_forever()
-
-    loop = asyncio.new_event_loop()
-    t = threading.Thread(target=run_event_loop, args=(loop,))
-    t.start()
-
-    stream = CamGear(source=url, stream_mode=True, logging=True).start()
-    stream_running = True
-    while stream_running:
-        frame = stream.read()
-        if frame is None:
-            break
-        process_a_frame(frame, loop, camera_id)
-        if display_frame:
-            cv2.imshow("Output Frame", frame)
-        key = cv2.waitKey(15) & 0xFF
-        if key == ord("q"):
-            stop_stream()
-            t.join()
-            break
-    if display_frame:
-        cv2.destroyAllWindows()
-        t.join()
-
-
-def stop_stream():
-    """Function to stop the YouTube stream."""
-    global stream, stream_running, display_frame
-    if stream is not None:
-        stream_running = False
-        stream.stop()
-        stream = None
-        if display_frame:
-            cv2.destroyAllWindows()
-
-
-def stream_manager():
-    """Thread function to manage the stream."""
-    global stream_url, streaming_thread, stream_running
-    while True:
-        if stream_running:
-            start_stream(stream_url)
-        time.sleep(1)
+# Email alerts a previous run left in the outbox
+alert_dispatcher.start()
 
 
 @app.route("/start", methods=["POST"])
 def start():
-    """API to start the stream."""
-    global stream_running, streaming_thread
-
-    camera = Camera.query.filter_by(monitoring=True).first()
-    if camera is None:
+    """API to start every monitoring camera that isn't running yet."""
+    cameras = Camera.query.filter_by(monitoring=True).all()
+    if not cameras:
         return jsonify({"error": "Nothing is monitoring ready."}), 400
 
-    if stream_running:
-        return jsonify({"error": "Stream is already running!"}), 400
+    started = []
+    errors = {}
+    for camera in cameras:
+        if supervisor.is_running(camera.id):
+            continue
+        try:
+            supervisor.start(camera.id, camera.url, camera.sample_fps)
+            started.append(camera.id)
+        except ValueError as e:
+            errors[camera.id] = str(e)
 
-    stream_url = camera.url
+    return jsonify({"started": started, "errors": errors}), 200
 
-    # Start streaming thread
-    streaming_thread = threading.Thread(
-        target=start_stream, args=(stream_url, camera.id)
-    )
-    streaming_thread.start()
 
-    return jsonify({"message": f"Stream started with URL: {stream_url}"}), 200
+@app.route("/start/<int:camera_id>", methods=["POST"])
+def start_camera(camera_id):
+    """API to start the stream of one camera."""
+    camera = Camera.query.get(camera_id)
+    if camera is None:
+        return jsonify({"error": "Camera not found"}), 404
+    if not camera.monitoring:
+        return jsonify({"error": "Camera is not monitoring ready."}), 400
+
+    try:
+        supervisor.start(camera.id, camera.url, camera.sample_fps)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"message": f"Stream started with URL: {camera.url}"}), 200
 
 
 @app.route("/stop", methods=["POST"])
 def stop():
-    """API to stop the stream."""
-    global stream_running
-    if not stream_running:
+    """API to stop every running stream."""
+    stopped = supervisor.stop_all()
+    if not stopped:
+        return jsonify({"error": "No stream is running!"}), 400
+
+    return jsonify({"message": "Streams stopped!", "stopped": stopped}), 200
+
+
+@app.route("/stop/<int:camera_id>", methods=["POST"])
+def stop_camera(camera_id):
+    """API to stop the stream of one camera."""
+    if not supervisor.stop(camera_id):
         return jsonify({"error": "No stream is running!"}), 400
 
-    stop_stream()
     return jsonify({"message": "Stream stopped!"}), 200
 
 
+@app.get("/streams")
+def streams():
+    """API to list the running streams and their ingest counters."""
+    return jsonify(supervisor.status())
+
+
+@app.get("/preview/<int:camera_id>")
+def preview(camera_id):
+    """API to watch a running camera as a low-rate MJPEG stream (e.g. in an <img>)."""
+    if not supervisor.is_running(camera_id):
+        return jsonify({"error": "No stream is running!"}), 400
+    return app.response_class(
+        previews.get(camera_id).stream(),
+        mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+        direct_passthrough=True,
+    )
+
+
+@app.get("/caption_cache")
+def caption_cache_stats():
+    """API to read the caption cache hit/miss counters."""
+    return jsonify(caption_cache.stats())
+
+
+@app.get("/caption_queue")
+def caption_queue_stats():
+    """API to read the per-camera caption queue depth, drops and oldest frame age."""
+    return jsonify(caption_batcher.stats())
+
+
+@app.get("/alert_dispatcher")
+def alert_dispatcher_stats():
+    """API to read the alert email counters."""
+    return jsonify(alert_dispatcher.stats())
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint: ingest, detection, captioning, DB, email and chat metrics."""
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route("/process_image", methods=["POST"])
 def process_image():
     """API to stop the stream."""
@@ -118,28 +139,24 @@ def process_image():
     return jsonify({"message": "image processed!"}), 200
 
 
-@app.route("/change", methods=["POST"])
-def change():
-    """API to change the stream URL while streaming."""
-    global stream_url, stream_running, streaming_thread
-
+@app.route("/change/<int:camera_id>", methods=["POST"])
+def change(camera_id):
+    """API to change the stream URL of a camera while streaming."""
     data = request.json
     url = data.get("url")
     if not url:
         return jsonify({"error": "Please provide a valid URL"}), 400
 
-    if not stream_running:
+    if not supervisor.is_running(camera_id):
         return jsonify({"error": "No stream is running!"}), 400
 
-    # Stop current stream and start with new URL
-    stop_stream()
-    stream_url = url
-
-    # Restart stream with new URL
-    streaming_thread = threading.Thread(target=start_stream, args=(stream_url,))
-    streaming_thread.start()
+    # Restart the camera's worker with the new URL
+    try:
+        supervisor.change(camera_id, url)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify({"message": f"Stream changed to URL: {stream_url}"}), 200
+    return jsonify({"message": f"Stream changed to URL: {url}"}), 200
 
 
 @app.get("/getcams")
@@ -154,6 +171,7 @@ def getcams():
                 "name": d.name,
                 "url": d.url,
                 "start_time": d.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "sample_fps": d.sample_fps,
             }
             for d in Camera.query.all()
         ]
@@ -164,18 +182,13 @@ def getcams():
 def addcams():
     data = request.json
     try:
-        # Check if there is already a camera with monitoring set to True
-        existing_monitoring_camera = Camera.query.filter_by(monitoring=True).first()
-
-        if data.get("monitoringStatus") and existing_monitoring_camera:
-            return jsonify({"error": "Only 1 camera should be monitoring"}), 400
-
         cam = Camera()
         cam.email = data["email"]
         cam.live = data["live"]
         cam.monitoring = data["monitoringStatus"]
         cam.name = data["name"]
         cam.url = data["url"]
+        cam.sample_fps = data.get("sample_fps")
 
         if "start_time" in data:
             cam.start_time = datetime.strptime(data["start_time"], "%Y-%m-%d %H:%M:%S")
@@ -204,14 +217,6 @@ def update_cam(camera_id):
         if not cam:
             return jsonify({"error": "Camera not found"}), 404
 
-        # Check if another camera is already set as monitoring, and prevent updates if so
-        if "monitoringStatus" in data and data["monitoringStatus"]:
-            existing_monitoring_camera = Camera.query.filter(
-                Camera.monitoring == True, Camera.id != camera_id
-            ).first()
-            if existing_monitoring_camera:
-                return jsonify({"error": "Only 1 camera should be monitoring"}), 400
-
         # Update the camera fields based on the request data
         if "email" in data:
             cam.email = data["email"]
@@ -223,6 +228,8 @@ def update_cam(camera_id):
             cam.name = data["name"]
         if "url" in data:
             cam.url = data["url"]
+        if "sample_fps" in data:
+            cam.sample_fps = data["sample_fps"]
 
         if "start_time" in data:
             cam.start_time = datetime.strptime(data["start_time"], "%Y-%m-%d %H:%M:%S")
@@ -230,6 +237,15 @@ def update_cam(camera_id):
         # Commit the changes to the database
         db.session.commit()
 
+        # Keep a running stream in line with the updated camera
+        if supervisor.is_running(camera_id):
+            if not cam.monitoring:
+                supervisor.stop(camera_id)
+            elif "url" in data:
+                supervisor.change(camera_id, cam.url)
+            if "sample_fps" in data:
+                supervisor.set_sample_fps(camera_id, cam.sample_fps)
+
         return jsonify({"msg": "Camera updated successfully"})
 
     except Exception as e:
@@ -238,158 +254,263 @@ def update_cam(camera_id):
         return error, 400
 
 
+# Listing endpoints take ?after_id=&limit= (keyset paging, next page id in
+# the X-Next-After-Id header), ?since=&until=, ?fields=a,b and ?format=ndjson
 @app.get("/transcripts/<int:camera_id>")
 def get_all_transcripts(camera_id):
-    return jsonify(
-        [
-            {
-                "frame_number": d.frame_number,
-                "unusual_activity": d.unusual_activity,
-                "human_activity": d.human_activity,
-                "animal_activity": d.animal_activity,
-                "time": d.time,
-                "unusual_crowd": d.unusual_crowd,
-                "lighting_conditions": d.lighting_conditions,
-                "vehicle_details": d.vehicle_details,
-                "number_of_individuals": d.number_of_individuals,
-                "object_presence": d.object_presence,
-                "context_notes": d.context_notes,
-            }
-            for d in TranscriptDetailed.query.filter_by(camera_id=camera_id).all()
-        ]
-    )
+    try:
+        params = list_params(request.args, TRANSCRIPT_FIELDS)
+        query = transcripts_select(
+            camera_id,
+            params["fields"],
+            None,
+            params["after_id"],
+            params["limit"],
+            params["since"],
+            params["until"],
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return list_response(query, "id", params)
 
 
 @app.get("/transcripts/<string:activity_name>/")
 @app.get("/transcripts/<string:activity_name>/<int:camera_id>")
 def activity_name(activity_name, camera_id=None):
-
-    query = TranscriptDetailed.query.with_entities(
-        TranscriptDetailed.frame_number,
-        getattr(TranscriptDetailed, activity_name),
-        TranscriptDetailed.context_notes,
-    )
-
-    # If camera_id is provided, filter by that camera_id
-    if camera_id is not None:
-        query = query.filter_by(camera_id=camera_id).filter(
-            getattr(TranscriptDetailed, activity_name) != "none"
+    try:
+        params = list_params(
+            request.args,
+            TRANSCRIPT_FIELDS,
+            ("frame_number", activity_name, "context_notes"),
+        )
+        # Without a camera every row is listed, "none" included
+        query = transcripts_select(
+            camera_id,
+            params["fields"],
+            activity_name if camera_id is not None else None,
+            params["after_id"],
+            params["limit"],
+            params["since"],
+            params["until"],
         )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return list_response(query, "id", params)
 
-    # Fetch all matching records
-    data = query.all()
 
-    # Return the JSON response with dynamic field name
-    return jsonify(
-        [
-            {
-                "frame_number": d.frame_number,
-                activity_name: getattr(d, activity_name),
-                "context_notes": d.context_notes,
-            }
-            for d in data
-        ]
-    )
+ALERT_FIELDS = (
+    "id",
+    "camera_id",
+    "frame_number",
+    "alert_type",
+    "description",
+    "timestamp",
+    "status",
+)
 
 
 @app.get("/alerts/")
 @app.get("/alerts/<int:camera_id>")
 def alerts(camera_id=None):
-    query = Alert.query
-
-    # If camera_id is provided, filter by that camera_id
-    if camera_id is not None:
-        query = query.filter_by(camera_id=camera_id)
+    try:
+        params = list_params(request.args, ALERT_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = keyset_select(
+        Alert,
+        Alert.id,
+        params["fields"],
+        [Alert.camera_id == camera_id] if camera_id is not None else [],
+        params["after_id"],
+        params["limit"],
+        Alert.timestamp,
+        params["since"],
+        params["until"],
+    )
+    return list_response(query, "id", params)
 
-    # Fetch all matching records
-    data = query.all()
 
-    # Return the JSON response with dynamic field name
-    return jsonify(
-        [
-            {
-                "camera_id": d.camera_id,
-                "frame_number": d.frame_number,
-                "alert_type": d.alert_type,
-                "description": d.description,
-                "timestamp": d.timestamp,
-                "status": d.status,
-            }
-            for d in data
-        ]
-    )
+ANALYTICS_FIELDS = (
+    "camera_id",
+    "total_footage_analyzed",
+    "total_individuals_detected",
+    "total_unusual_incidents",
+    "total_animal_incidents",
+    "total_unusual_crowd_incidents",
+    "total_vehicle_detected",
+    "created_at",
+)
 
 
 @app.get("/analytics/")
 @app.get("/analytics/<int:camera_id>")
 def analytics(camera_id=None):
-    query = AnalyticsData.query
+    # One row per camera, keyed (and paged) by camera_id
+    try:
+        params = list_params(request.args, ANALYTICS_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = keyset_select(
+        AnalyticsData,
+        AnalyticsData.camera_id,
+        params["fields"],
+        [AnalyticsData.camera_id == camera_id] if camera_id is not None else [],
+        params["after_id"],
+        params["limit"],
+        AnalyticsData.created_at,
+        params["since"],
+        params["until"],
+    )
+    return list_response(query, "camera_id", params)
 
-    # If camera_id is provided, filter by that camera_id
-    if camera_id is not None:
-        query = query.filter_by(camera_id=camera_id)
 
-    # Fetch all matching records
-    data = query.all()
+@app.get("/analytics/<int:camera_id>/rollups")
+def analytics_rollups(camera_id):
+    """API for per-bucket analytics of a camera.
 
-    # Return the JSON response with dynamic field name
-    return jsonify(
-        [
-            {
-                "camera_id": d.camera_id,
-                "total_footage_analyzed": d.total_footage_analyzed,
-                "total_individuals_detected": d.total_individuals_detected,
-                "total_unusual_incidents": d.total_unusual_incidents,
-                "total_animal_incidents": d.total_animal_incidents,
-                "total_unusual_crowd_incidents": d.total_unusual_crowd_incidents,
-                "total_vehicle_detected": d.total_vehicle_detected,
-                "created_at": d.created_at,
-            }
-            for d in data
-        ]
+    ?granularity=minute|hour|day (default hour) and ?since=&until= (epoch
+    seconds or ISO 8601; default the last 24 hours). Only buckets with
+    footage are returned.
+    """
+    try:
+        until = parse_time(request.args["until"]) if request.args.get("until") else datetime.now()
+        since = (
+            parse_time(request.args["since"])
+            if request.args.get("since")
+            else until - timedelta(hours=24)
+        )
+        buckets = rollups(camera_id, request.args.get("granularity", "hour"), since, until)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(buckets)
+
+
+@app.get("/frames/<int:camera_id>/<int:frame_number>")
+def get_frame(camera_id, frame_number):
+    """API to fetch a stored keyframe, optionally as a ?size=<px> thumbnail."""
+    located = frame_store.locate(camera_id, frame_number)
+    if located is None:
+        return jsonify({"error": "Frame not found"}), 404
+    path, offset, length, created_at = located
+
+    size = request.args.get("size", type=int)
+    etag = f"{camera_id}-{frame_number}-{length}"
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if size:
+        body = frame_thumbnail(camera_id, frame_number, size)
+        etag += f"-{size}"
+    elif file_wrapper is not None and request.range is None:
+        # Streamed straight from the segment file, without copying it into memory
+        body = file_wrapper(FrameReader(path, offset, length))
+    else:
+        body = frame_store.get(camera_id, frame_number)
+    if body is None:
+        return jsonify({"error": "Frame not found"}), 404
+
+    response = app.response_class(body, mimetype="image/jpeg", direct_passthrough=True)
+    response.content_length = len(body) if isinstance(body, bytes) else length
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(created_at, timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(
+        request, accept_ranges=True, complete_length=response.content_length
     )
 
 
+@lru_cache(maxsize=1024)
+def frame_thumbnail(camera_id, frame_number, size):
+    image = frame_store.get(camera_id, frame_number)
+    if image is None:
+        return None
+    frame = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(
+            frame,
+            (max(1, int(width * scale)), max(1, int(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    _, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+    return buffer.tobytes()
+
+
+def frame_refs(camera_id, frame_numbers, thumbnail=None):
+    """URLs of the stored keyframes, instead of inlining them into the JSON."""
+    refs = []
+    for f in frame_numbers or []:
+        ref = {"frame_number": int(f), "url": f"/frames/{camera_id}/{f}"}
+        if thumbnail:
+            ref["thumbnail_url"] = f"/frames/{camera_id}/{f}?size={thumbnail}"
+        refs.append(ref)
+    return refs
+
+
 @app.get("/chat/<int:camera_id>")
 def chat_history(camera_id=None):
+    """API to page through chat history, newest page first.
+
+    ?limit=<n> (default 50) and ?before_id=<id> select the page; the response
+    carries next_before_id for the following (older) page.
+    """
+    limit = request.args.get("limit", 50, type=int)
+    if not 1 <= limit <= 500:
+        return jsonify({"error": "limit must be between 1 and 500"}), 400
+    before_id = request.args.get("before_id", type=int)
+    thumbnail = request.args.get("thumbnail", type=int)
+
     query = Chats.query
 
     # If camera_id is provided, filter by that camera_id
     if camera_id is not None:
         query = query.filter_by(camera_id=camera_id)
+    if before_id is not None:
+        query = query.filter(Chats.id < before_id)
 
-    # Fetch all matching records
-    data = query.all()
+    # Fetch one page, newest first, and hand it back in chronological order
+    data = query.order_by(Chats.id.desc()).limit(limit).all()
+    data.reverse()
 
-    # Return the JSON response with dynamic field name
     return jsonify(
-        [
-            {
-                "camera_id": d.camera_id,
-                "user_query": d.request,
-                "response": d.response,
-                "timestamp": d.timestamp,
-                "frames": [
-                            image_path_to_image_b64(f"./frames/{d.camera_id}/{f}.jpg")
-                            for f in d.frames
-                ],
-            }
-            for d in data
-        ]
+        {
+            "chats": [
+                {
+                    "id": d.id,
+                    "camera_id": d.camera_id,
+                    "user_query": d.request,
+                    "response": d.response,
+                    "timestamp": d.timestamp,
+                    "frames": frame_refs(d.camera_id, d.frames, thumbnail),
+                }
+                for d in data
+            ],
+            "next_before_id": data[0].id if data and len(data) == limit else None,
+        }
     )
 
 
-def image_path_to_image_b64(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
-
-
 @app.post("/chat/<int:camera_id>")
 def chat(camera_id=None):
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get("user_query"), str):
+        return jsonify({"error": "user_query is required"}), 400
     user_query = data["user_query"]
+    thumbnail = request.args.get("thumbnail", type=int)
+    # Optional retrieval knobs: transcripts to consider and a time window
+    # (epoch seconds or ISO 8601, as for /analytics)
+    try:
+        k = min(max(int(data.get("k", CHAT_TOP_K)), 1), 50)
+        since, until = (
+            parse_time(str(data[key])).timestamp() if data.get(key) is not None else None
+            for key in ("since", "until")
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid k, since or until: {e}"}), 400
 
-    response, frame_numbers = get_response_online(user_query, camera_id)
+    response, frame_numbers = get_response_online(user_query, camera_id, k, since, until)
+    frame_numbers = [int(f) for f in frame_numbers]
 
     chat = Chats()
     chat.camera_id = camera_id
@@ -399,16 +520,9 @@ def chat(camera_id=None):
     db.session.add(chat)
     db.session.commit()
 
-    # return {
-    #     "response": response,
-    #     "frames": [],
-    # }
     return {
         "response": response,
-        "frames": [
-            image_path_to_image_b64(f"./frames/{camera_id}/{f}.jpg")
-            for f in frame_numbers
-        ],
+        "frames": frame_refs(camera_id, frame_numbers, thumbnail),
     }
 
 
@@ -0,0 +1,217 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Every metric, in the order /metrics lists them
+registry = []
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Timer:
+    """Context manager observing its duration, in seconds, into a histogram."""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """A metric family: one child series per combination of label values.
+
+    labels() is a dict lookup once the series exists, so hot loops can also
+    keep the child it returns and skip even that. A metric without labels
+    acts as its own only series.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.child = self.labels()
+        registry.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames)}")
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{format_labels(labelnames, values)} {format_value(self.value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.child.inc(amount)
+
+
+class HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # counts[i] holds observations in (buckets[i - 1], buckets[i]]; the
+        # last one those above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return Timer(self)
+
+    def render(self, name, labelnames, values):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = format_labels(labelnames, values, [("le", format_value(float(bound)))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.child.observe(value)
+
+    def time(self):
+        return self.child.time()
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Prometheus text format version /metrics is served as
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+frames_read = Counter(
+    "watchdog_frames_read_total", "Frames decoded from the camera stream.", ["camera"]
+)
+frames_detected = Counter(
+    "watchdog_frames_detected_total", "Sampled frames run through scene detection.", ["camera"]
+)
+scene_changes = Counter(
+    "watchdog_scene_changes_total", "Scene changes detected.", ["camera"]
+)
+captions_reused = Counter(
+    "watchdog_captions_reused_total", "Scene changes captioned from the caption cache.", ["camera"]
+)
+caption_batch_failures = Counter(
+    "watchdog_caption_batch_failures_total",
+    "Caption batches whose request handler raised.",
+    ["camera"],
+)
+encode_seconds = Histogram(
+    "watchdog_frame_encode_seconds", "Time to downsize and JPEG-encode a scene change frame."
+)
+vision_request_seconds = Histogram(
+    "watchdog_vision_request_seconds", "Vision API request latency, per attempt."
+)
+vision_responses = Counter(
+    "watchdog_vision_responses_total",
+    "Vision API attempts by HTTP status (timeout and error when there was none).",
+    ["status"],
+)
+caption_parse_failures = Counter(
+    "watchdog_caption_parse_failures_total", "Vision replies that didn't parse into captions."
+)
+db_commit_seconds = Histogram(
+    "watchdog_db_commit_seconds", "Time to commit a caption transaction."
+)
+db_commit_failures = Counter(
+    "watchdog_db_commit_failures_total", "Caption transactions rolled back."
+)
+email_send_seconds = Histogram(
+    "watchdog_email_send_seconds", "Time to send an alert email.", ["outcome"]
+)
+chat_retrieval_seconds = Histogram(
+    "watchdog_chat_retrieval_seconds", "Chat transcript search, embedding to fetched rows."
+)
+chat_llm_seconds = Histogram(
+    "watchdog_chat_llm_seconds", "Chat answer generation by the LLM."
+)
+trace_spans_dropped = Counter(
+    "watchdog_trace_spans_dropped_total", "Trace spans dropped by a full queue or failed export."
+)
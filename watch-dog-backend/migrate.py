@@ -0,0 +1,80 @@
+"""Upgrade an existing database to the current models in db.py.
+
+db.create_all() creates missing tables but never alters existing ones. This
+adds missing columns, backfills the activity flags of existing transcripts in
+id-range batches (so no statement holds a long lock) and creates missing
+indexes. Safe to re-run. Run from watch-dog-backend:
+
+    python migrate.py [--batch 5000]
+"""
+
+import argparse
+from db import ACTIVITY_FLAGS, NONE_VALUES, TranscriptDetailed, app, db, missing_schema
+
+
+def add_missing_columns(connection):
+    inspector = db.inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(
+                db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            )
+            print(f"Added {table.name}.{column.name}")
+
+
+def backfill_activity_flags(batch):
+    """Set the *_present flags on rows written before the flags existed."""
+    table = TranscriptDetailed.__table__
+    values = {
+        flag: db.func.lower(db.func.trim(db.func.coalesce(table.c[field], ""))).notin_(
+            NONE_VALUES
+        )
+        for field, flag in ACTIVITY_FLAGS.items()
+    }
+    pending = table.c.unusual_activity_present.is_(None)
+    first, last = db.session.execute(
+        db.select(db.func.min(table.c.id), db.func.max(table.c.id)).where(pending)
+    ).one()
+    if first is None:
+        return
+    updated = 0
+    for start in range(first, last + 1, batch):
+        result = db.session.execute(
+            table.update()
+            .where(pending, table.c.id >= start, table.c.id < start + batch)
+            .values(values)
+        )
+        db.session.commit()
+        updated += result.rowcount
+    print(f"Backfilled activity flags on {updated} transcripts")
+
+
+def create_missing_indexes(connection):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def migrate(batch=5000):
+    with db.engine.begin() as connection:
+        add_missing_columns(connection)
+    backfill_activity_flags(batch)
+    with db.engine.begin() as connection:
+        create_missing_indexes(connection)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=5000, help="rows per backfill update")
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate(args.batch)
+        missing = missing_schema(db.engine)
+        print("Schema up to date" if not missing else f"Still missing: {missing}")
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from frame_encoder import FrameEncoder
+
+# Frames per second sent to each preview client
+PREVIEW_FPS = float(os.getenv("PREVIEW_FPS", 2))
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", 640))
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", 70))
+# A preview stream ends after this many seconds without a new frame
+PREVIEW_IDLE_TIMEOUT = float(os.getenv("PREVIEW_IDLE_TIMEOUT", 10))
+
+BOUNDARY = "frame"
+
+
+class CameraPreview:
+    """Latest frame of one camera, JPEG-encoded for MJPEG clients on demand.
+
+    The ingest thread only calls offer(), which keeps a reference to the frame
+    while someone is watching and does nothing otherwise. Encoding happens on
+    the client's response thread, at most once per frame and PREVIEW_FPS
+    times a second however many clients share it.
+    """
+
+    def __init__(self, camera_id, fps=PREVIEW_FPS):
+        self.camera_id = camera_id
+        self.interval = 1 / fps
+        self.lock = threading.Lock()
+        self.encoder = FrameEncoder(max_side=PREVIEW_MAX_SIDE, quality=PREVIEW_JPEG_QUALITY)
+        self.viewers = 0
+        self.frame = None
+        self.sequence = 0
+        self.encoded = (0, None)
+        self.encodes = 0
+
+    def offer(self, frame):
+        if self.viewers:
+            self.frame = frame
+            self.sequence += 1
+
+    def _latest_jpeg(self):
+        with self.lock:
+            sequence, frame = self.sequence, self.frame
+            if frame is not None and self.encoded[0] != sequence:
+                self.encoded = (sequence, self.encoder.encode(frame).tobytes())
+                self.encodes += 1
+            return self.encoded
+
+    def stream(self):
+        """multipart/x-mixed-replace body; counts as a viewer until closed."""
+        with self.lock:
+            self.viewers += 1
+        try:
+            sent = None
+            last_frame_at = time.monotonic()
+            while True:
+                started = time.monotonic()
+                sequence, jpeg = self._latest_jpeg()
+                if sequence != sent and jpeg is not None:
+                    sent, last_frame_at = sequence, started
+                    yield (
+                        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n\r\n"
+                    ).encode() + jpeg + b"\r\n"
+                elif started - last_frame_at > PREVIEW_IDLE_TIMEOUT:
+                    return
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            with self.lock:
+                self.viewers -= 1
+                if not self.viewers:
+                    # Don't pin a full-resolution frame nobody is watching
+                    self.frame = None
+
+    def stats(self):
+        return {"viewers": self.viewers, "encodes": self.encodes}
+
+
+class PreviewHub:
+    """One CameraPreview per camera, kept across stream restarts."""
+
+    def __init__(self):
+        self.previews = {}
+        self.lock = threading.Lock()
+
+    def get(self, camera_id):
+        with self.lock:
+            preview = self.previews.get(camera_id)
+            if preview is None:
+                preview = self.previews[camera_id] = CameraPreview(camera_id)
+            return preview
+
+
+previews = PreviewHub()
@@ -0,0 +1,356 @@
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+from multiprocessing import resource_tracker, shared_memory
+import cv2
+import numpy as np
+from scenedetect import SceneManager
+from scenedetect.detectors import HashDetector
+
+logger = logging.getLogger(__name__)
+
+# Number of detector processes, defaults to one per core
+SCENE_POOL_WORKERS = int(os.getenv("SCENE_POOL_WORKERS", os.cpu_count() or 1))
+# Shared-memory frame slots per camera, i.e. frames in flight per camera
+SCENE_POOL_SLOTS = int(os.getenv("SCENE_POOL_SLOTS", 4))
+
+HASH_THRESHOLD = 0.03
+HASH_SIZE = 8
+HASH_LOWPASS = 2
+# Side of the grayscale image detection runs on: exactly what the hash resizes to
+DETECTION_SIDE = HASH_SIZE * HASH_LOWPASS
+# Longest side frames are linearly shrunk to before the area resize
+PRESCALE_SIDE = 256
+
+
+class DetectionDownscaler:
+    """Shrinks one camera's frames to the grayscale image scene detection uses.
+
+    A cheap linear resize to at most PRESCALE_SIDE pixels comes first; the
+    area resize to DETECTION_SIDE square is ~25x slower straight from 1080p.
+    Conversion to gray happens last, on the tiny image. All targets are
+    preallocated and reused (the prescale one again if the frame size
+    changes), so the returned image is overwritten by the next prepare().
+    """
+
+    def __init__(self, side=DETECTION_SIDE, prescale_side=PRESCALE_SIDE):
+        self.size = (side, side)
+        self.prescale_side = prescale_side
+        self.prescaled = None
+        self.small = np.empty((side, side, 3), dtype=np.uint8)
+        self.gray = np.empty((side, side), dtype=np.uint8)
+
+    def prescale(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.prescale_side / max(height, width)
+        if scale >= 1:
+            return frame
+        shape = (max(1, int(height * scale)), max(1, int(width * scale))) + frame.shape[2:]
+        if self.prescaled is None or self.prescaled.shape != shape:
+            self.prescaled = np.empty(shape, dtype=frame.dtype)
+        return cv2.resize(
+            frame, (shape[1], shape[0]), dst=self.prescaled, interpolation=cv2.INTER_LINEAR
+        )
+
+    def prepare(self, frame):
+        frame = self.prescale(frame)
+        if frame.ndim == 2:
+            return cv2.resize(frame, self.size, dst=self.gray, interpolation=cv2.INTER_AREA)
+        cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+
+class SceneHashDetector(HashDetector):
+    """HashDetector that keeps the last frame-to-frame hash distance.
+
+    distance (0-1) is what the frame sampler adapts its rate to. Only the
+    previous hash is kept, not a copy of the previous frame. Accepts BGR
+    frames or DetectionDownscaler output; a grayscale frame already
+    DETECTION_SIDE square skips the conversion and the resize.
+    """
+
+    def __init__(self, threshold=HASH_THRESHOLD, size=HASH_SIZE, lowpass=HASH_LOWPASS, **kwargs):
+        super().__init__(threshold=threshold, size=size, lowpass=lowpass, **kwargs)
+        self.distance = 0.0
+
+    @staticmethod
+    def hash_frame(frame_img, hash_size, factor):
+        if frame_img.ndim == 3:
+            return HashDetector.hash_frame(frame_img, hash_size, factor)
+        imsize = hash_size * factor
+        if frame_img.shape != (imsize, imsize):
+            frame_img = cv2.resize(frame_img, (imsize, imsize), interpolation=cv2.INTER_AREA)
+        # The rest of HashDetector.hash_frame: median-thresholded low DCT frequencies
+        dct = cv2.dct(np.float32(frame_img) / max(int(frame_img.max()), 1))
+        low_freq = dct[:hash_size, :hash_size]
+        return low_freq > np.median(low_freq)
+
+    def process_frame(self, timecode, frame_img):
+        if self._last_scene_cut is None:
+            self._last_scene_cut = timecode
+        curr_hash = self.hash_frame(frame_img=frame_img, hash_size=self._size, factor=self._factor)
+        last_hash, self._last_hash = self._last_hash, curr_hash
+        if last_hash.size == 0:
+            return []
+        self.distance = np.count_nonzero(curr_hash != last_hash) / self._size_sq
+        if self.distance >= self._threshold and (
+            (timecode - self._last_scene_cut) >= self._min_scene_len
+        ):
+            self._last_scene_cut = timecode
+            return [timecode]
+        return []
+
+
+def new_scene_manager(detector=None):
+    scene_manager = SceneManager()
+    scene_manager.add_detector(detector or SceneHashDetector())
+    return scene_manager
+
+
+def _detector_worker(tasks, results):
+    """Runs in a child process: keeps one SceneManager per stream routed here."""
+    scene_managers = {}
+    detectors = {}
+    segments = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        kind = task[0]
+        if kind == "frame":
+            _, stream_id, frame_number, name, shape, dtype, slot = task
+            shm = segments.get(name)
+            if shm is None:
+                shm = segments[name] = shared_memory.SharedMemory(name=name)
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            scene_manager = scene_managers.get(stream_id)
+            if scene_manager is None:
+                detectors[stream_id] = SceneHashDetector()
+                scene_manager = scene_managers[stream_id] = new_scene_manager(
+                    detectors[stream_id]
+                )
+            try:
+                is_cut = scene_manager._process_frame(frame_number, frame)
+            except Exception as e:
+                logger.error("scene detection failed: %s", e, extra={"stream_id": stream_id})
+                is_cut = False
+            del frame
+            results.put(
+                (stream_id, frame_number, slot, is_cut, detectors[stream_id].distance)
+            )
+        elif kind == "release":
+            _, stream_id, names, forget_detector = task
+            if forget_detector:
+                scene_managers.pop(stream_id, None)
+                detectors.pop(stream_id, None)
+            for name in names:
+                shm = segments.pop(name, None)
+                if shm is not None:
+                    shm.close()
+            results.put(("released", stream_id))
+    for shm in segments.values():
+        shm.close()
+
+
+class _CameraRing:
+    """Shared-memory frame slots owned by one camera."""
+
+    def __init__(self, worker, shape, dtype, slots):
+        self.worker = worker
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        self.segments = [
+            shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(slots)
+        ]
+        self.views = [
+            np.ndarray(shape, dtype=self.dtype, buffer=shm.buf) for shm in self.segments
+        ]
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        # slot -> (frame_number, original frame, callback)
+        self.pending = {}
+        # Hash distance of the stream's latest detected frame
+        self.distance = 0.0
+
+    def fits(self, frame):
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def names(self):
+        return [shm.name for shm in self.segments]
+
+    def drain(self):
+        """Wait for every in-flight frame of this camera to come back."""
+        taken = [self.free.get() for _ in self.segments]
+        for slot in taken:
+            self.free.put(slot)
+
+    def destroy(self):
+        self.views = []
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+
+
+class ScenePool:
+    """Scene detection in a pool of worker processes.
+
+    Frames are copied once into per-camera shared-memory slots and only the
+    slot name travels through the task queue. Each stream (one camera run) is
+    pinned to one worker, so its detector state lives in a single process and
+    its results come back in frame order.
+
+    Since detection runs on DetectionDownscaler output, a frame costs less
+    to detect inline than to hand to a worker, and bench_scene_pool measures
+    the pool below inline throughput. It only pays off when detection itself
+    is expensive (e.g. on full frames) and there are cores to spare.
+    """
+
+    def __init__(self, workers=SCENE_POOL_WORKERS, slots=SCENE_POOL_SLOTS):
+        self.slots = slots
+        ctx = mp.get_context()
+        # Workers must share our resource tracker; one started lazily inside a
+        # worker would "clean up" segments it merely attached to.
+        resource_tracker.ensure_running()
+        self.results = ctx.Queue()
+        self.task_queues = [ctx.Queue() for _ in range(workers)]
+        self.processes = [
+            ctx.Process(
+                target=_detector_worker, args=(tasks, self.results), daemon=True
+            )
+            for tasks in self.task_queues
+        ]
+        for process in self.processes:
+            process.start()
+        self.next_worker = itertools.cycle(range(workers))
+        self.rings = {}
+        self.released = {}
+        self.lock = threading.Lock()
+        self.collector = threading.Thread(
+            target=self._collect, name="scene-pool-collector", daemon=True
+        )
+        self.collector.start()
+
+    def submit(self, stream_id, frame_number, frame, on_scene_change, detect_frame=None):
+        """Queue a frame for detection.
+
+        Blocks while all of the stream's slots are in flight. detect_frame
+        (default frame) is what is copied to the worker and detected on, e.g.
+        DetectionDownscaler output. on_scene_change is called as
+        on_scene_change(frame_number, frame) from the collector thread, in
+        frame order, for every frame that starts a new scene.
+        """
+        if detect_frame is None:
+            detect_frame = frame
+        ring = self._ring_for(stream_id, detect_frame)
+        slot = ring.free.get()
+        np.copyto(ring.views[slot], detect_frame)
+        ring.pending[slot] = (frame_number, frame, on_scene_change)
+        self.task_queues[ring.worker].put(
+            (
+                "frame",
+                stream_id,
+                frame_number,
+                ring.segments[slot].name,
+                ring.shape,
+                ring.dtype.str,
+                slot,
+            )
+        )
+
+    def _ring_for(self, stream_id, frame):
+        with self.lock:
+            ring = self.rings.get(stream_id)
+        if ring is not None and ring.fits(frame):
+            return ring
+        worker = ring.worker if ring is not None else next(self.next_worker)
+        if ring is not None:
+            # Resolution changed: retire the old slots once they are idle
+            ring.drain()
+            self._release_ring(stream_id, ring, forget_detector=False)
+        ring = _CameraRing(worker, frame.shape, frame.dtype, self.slots)
+        with self.lock:
+            self.rings[stream_id] = ring
+        return ring
+
+    def distance(self, stream_id):
+        """Hash distance of the stream's most recently detected frame."""
+        with self.lock:
+            ring = self.rings.get(stream_id)
+        return ring.distance if ring is not None else 0.0
+
+    def _release_ring(self, stream_id, ring, forget_detector=True):
+        done = threading.Event()
+        with self.lock:
+            self.released[stream_id] = done
+        self.task_queues[ring.worker].put(
+            ("release", stream_id, ring.names(), forget_detector)
+        )
+        done.wait(timeout=5)
+        ring.destroy()
+
+    def release(self, stream_id):
+        """Forget a stream: wait for its frames, drop its detector and slots."""
+        with self.lock:
+            ring = self.rings.get(stream_id)
+        if ring is None:
+            return
+        # Results still in flight need the ring to hand their slots back
+        ring.drain()
+        with self.lock:
+            self.rings.pop(stream_id, None)
+        self._release_ring(stream_id, ring)
+
+    def _collect(self):
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            if result[0] == "released":
+                with self.lock:
+                    done = self.released.pop(result[1], None)
+                if done is not None:
+                    done.set()
+                continue
+            stream_id, frame_number, slot, is_cut, distance = result
+            with self.lock:
+                ring = self.rings.get(stream_id)
+            if ring is None:
+                continue
+            ring.distance = distance
+            _, frame, on_scene_change = ring.pending.pop(slot)
+            ring.free.put(slot)
+            if is_cut:
+                try:
+                    on_scene_change(frame_number, frame)
+                except Exception as e:
+                    logger.exception(
+                        "scene change handler failed: %s", e, extra={"stream_id": stream_id}
+                    )
+
+    def close(self):
+        for stream_id in list(self.rings):
+            self.release(stream_id)
+        for tasks in self.task_queues:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        self.results.put(None)
+        self.collector.join(timeout=5)
+
+
+scene_pool = None
+scene_pool_lock = threading.Lock()
+
+
+def get_scene_pool():
+    """Start the shared pool on first use."""
+    global scene_pool
+    with scene_pool_lock:
+        if scene_pool is None:
+            scene_pool = ScenePool()
+        return scene_pool
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from frame import SceneState, process_a_frame
+from preview import previews
+from frame_source import open_source
+from metrics import frames_read
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of cameras ingesting at the same time on this host
+MAX_ACTIVE_CAMERAS = int(os.getenv("MAX_ACTIVE_CAMERAS", 32))
+# Frames buffered between the reader and the scene detector of each camera
+FRAME_QUEUE_SIZE = int(os.getenv("FRAME_QUEUE_SIZE", 8))
+
+
+class CameraWorker:
+    """Ingest worker for one camera.
+
+    A reader thread pulls frames from the stream, keeps the ones the camera's
+    FrameSampler picks and puts them in a bounded queue, and a processing
+    thread drains it through scene detection. When the processor falls
+    behind, the oldest queued frame is dropped so the reader never blocks.
+    """
+
+    def __init__(self, camera_id, url, loop, on_exit=None, sample_fps=None):
+        self.camera_id = camera_id
+        self.url = url
+        self.loop = loop
+        self.on_exit = on_exit
+        self.state = SceneState(camera_id, sample_fps=sample_fps)
+        self.preview = previews.get(camera_id)
+        self.frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.stream = None
+        self.stream_lock = threading.Lock()
+        self.frames_dropped = 0
+        self.frames_read = frames_read.labels(camera_id)
+        self.reader = threading.Thread(
+            target=self._read_frames, name=f"camera-{camera_id}-reader", daemon=True
+        )
+        self.processor = threading.Thread(
+            target=self._process_frames,
+            name=f"camera-{camera_id}-processor",
+            daemon=True,
+        )
+
+    def start(self):
+        self.reader.start()
+        self.processor.start()
+
+    def stop(self):
+        self.stop_event.set()
+        # Stopping the stream unblocks a reader waiting in stream.read()
+        self._close_stream()
+
+    def _close_stream(self):
+        with self.stream_lock:
+            stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop()
+
+    def join(self, timeout=None):
+        self.reader.join(timeout)
+        self.processor.join(timeout)
+
+    def status(self):
+        return dict(
+            self.state.stats(),
+            camera_id=self.camera_id,
+            url=self.url,
+            running=not self.stop_event.is_set(),
+            frames_dropped=self.frames_dropped,
+            queue_depth=self.frames.qsize(),
+            preview=self.preview.stats(),
+        )
+
+    def _read_frames(self):
+        try:
+            stream = open_source(self.url).start()
+            with self.stream_lock:
+                self.stream = stream
+            self.state.sampler.set_source_fps(stream.framerate)
+            while not self.stop_event.is_set():
+                read_started = time.time_ns()
+                frame = stream.read()
+                if frame is None:
+                    break
+                self.frames_read.inc()
+                self.preview.offer(frame)
+                frame_number = self.state.sample()
+                if frame_number is not None:
+                    tracer.record("read", self.camera_id, frame_number, read_started)
+                    self._enqueue((frame_number, frame))
+        except Exception as e:
+            logger.error("stream error: %s", e, extra={"camera_id": self.camera_id})
+        finally:
+            self.stop_event.set()
+            self._close_stream()
+            # Wake the processor up in case it is waiting on an empty queue
+            self._enqueue(None)
+
+    def _enqueue(self, item):
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _process_frames(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            frame_number, frame = item
+            process_a_frame(frame, frame_number, self.loop, self.state)
+        self.state.close()
+        if self.on_exit is not None:
+            self.on_exit(self)
+
+
+class StreamSupervisor:
+    """Runs one CameraWorker per monitoring camera.
+
+    All workers share a single asyncio loop for caption requests, so adding a
+    camera costs two threads and its own SceneState rather than a new loop.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE_CAMERAS):
+        self.max_active = max_active
+        self.workers = {}
+        # Stopped workers whose threads are still finishing their last frames;
+        # their camera can't be started again until they exit
+        self.stopping = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.loop_thread = None
+
+    def _ensure_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+
+            def run_event_loop(loop):
+                asyncio.set_event_loop(loop)
+                loop.run_forever()
+
+            self.loop_thread = threading.Thread(
+                target=run_event_loop, args=(self.loop,), daemon=True
+            )
+            self.loop_thread.start()
+        return self.loop
+
+    def _worker_exited(self, worker):
+        with self.lock:
+            if self.workers.get(worker.camera_id) is worker:
+                del self.workers[worker.camera_id]
+            if self.stopping.get(worker.camera_id) is worker:
+                del self.stopping[worker.camera_id]
+
+    def _retire(self, camera_id):
+        # Call with self.lock held. A worker still in self.workers hasn't
+        # exited yet, so it is tracked until _worker_exited runs.
+        worker = self.workers.pop(camera_id, None)
+        if worker is not None:
+            self.stopping[camera_id] = worker
+        return worker
+
+    def is_running(self, camera_id):
+        with self.lock:
+            return camera_id in self.workers
+
+    def start(self, camera_id, url, sample_fps=None):
+        """Start ingesting a camera. Raises ValueError when it can't be started.
+
+        sample_fps overrides SAMPLE_FPS, the camera's base scene detection rate.
+        """
+        with self.lock:
+            if camera_id in self.workers:
+                raise ValueError(f"Camera {camera_id} is already running")
+            if camera_id in self.stopping:
+                # Both runs would number frames from the same stored last one
+                raise ValueError(f"Camera {camera_id} is still stopping, try again shortly")
+            if len(self.workers) >= self.max_active:
+                raise ValueError(
+                    f"Maximum of {self.max_active} active cameras reached"
+                )
+            worker = CameraWorker(
+                camera_id,
+                url,
+                self._ensure_loop(),
+                on_exit=self._worker_exited,
+                sample_fps=sample_fps,
+            )
+            self.workers[camera_id] = worker
+        worker.start()
+        return worker
+
+    def stop(self, camera_id):
+        """Stop a camera. Returns False when it wasn't running."""
+        with self.lock:
+            worker = self._retire(camera_id)
+        if worker is None:
+            return False
+        worker.stop()
+        return True
+
+    def change(self, camera_id, url):
+        """Restart a running camera on a new URL."""
+        with self.lock:
+            worker = self._retire(camera_id)
+        if worker is None:
+            raise ValueError(f"Camera {camera_id} is not running")
+        worker.stop()
+        worker.join(timeout=5)
+        return self.start(camera_id, url, worker.state.sampler.sample_fps)
+
+    def set_sample_fps(self, camera_id, sample_fps):
+        """Change a running camera's base sampling rate. Returns False when it isn't running."""
+        with self.lock:
+            worker = self.workers.get(camera_id)
+        if worker is None:
+            return False
+        worker.state.sampler.set_sample_fps(sample_fps)
+        return True
+
+    def stop_all(self):
+        with self.lock:
+            workers = [self._retire(camera_id) for camera_id in list(self.workers)]
+        for worker in workers:
+            worker.stop()
+        return [w.camera_id for w in workers]
+
+    def status(self):
+        with self.lock:
+            workers = list(self.workers.values())
+        return [w.status() for w in workers]
+
+
+supervisor = StreamSupervisor()
@@ -0,0 +1,289 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import urllib.request
+from metrics import trace_spans_dropped
+
+logger = logging.getLogger(__name__)
+
+# Fraction of frames traced, 0 (off) to 1; every stage agrees on which ones
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+# Spans are appended here, one JSON object per line
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+# OTLP/HTTP JSON endpoint (e.g. http://127.0.0.1:4318/v1/traces); replaces the file
+TRACE_OTLP_URL = os.getenv("TRACE_OTLP_URL")
+# Finished spans waiting for export; past this new ones are dropped
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", 10000))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "watch-dog-backend")
+
+# Most spans written or posted at once
+EXPORT_BATCH = 512
+MASK_64 = 2**64 - 1
+
+
+def sample_point(camera_id, frame_number):
+    """A fixed value in [0, 1) per frame (splitmix64 of the key)."""
+    x = (int(camera_id) * 0x9E3779B97F4A7C15 + int(frame_number)) & MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return (x ^ (x >> 31)) / 2**64
+
+
+def trace_id(camera_id, frame_number):
+    # Readable back to the frame: camera id, then frame number
+    return f"{int(camera_id):016x}{int(frame_number):016x}"
+
+
+class Span:
+    """A stage timed for one or more sampled frames; each gets its own copy."""
+
+    def __init__(self, tracer, name, keys, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.keys = keys
+        self.attributes = attributes
+        self.start = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.export(self.name, self.keys, self.start, time.time_ns(), self.attributes)
+
+
+class NoSpan:
+    """What span() returns when no frame is sampled: does nothing."""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class FileExporter:
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(span, default=str) + "\n" for span in spans)
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes):
+    return [{"key": key, "value": otlp_value(value)} for key, value in attributes.items()]
+
+
+class OTLPExporter:
+    """POSTs spans to an OpenTelemetry collector in the OTLP/HTTP JSON encoding."""
+
+    def __init__(self, url=TRACE_OTLP_URL, service_name=TRACE_SERVICE_NAME, timeout=5):
+        self.url = url
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def payload(self, spans):
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": otlp_attributes({"service.name": self.service_name})},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "watch-dog"},
+                            "spans": [
+                                {
+                                    "traceId": span["traceId"],
+                                    "spanId": span["spanId"],
+                                    "name": span["name"],
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(span["startTimeUnixNano"]),
+                                    "endTimeUnixNano": str(span["endTimeUnixNano"]),
+                                    "attributes": otlp_attributes(span["attributes"]),
+                                    "status": {"code": 2 if "error" in span["attributes"] else 1},
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, spans):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self.payload(spans), default=str).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """Per-stage spans of a frame's journey, keyed by (camera_id, frame_number).
+
+    A frame's trace id is derived from its key and whether it is sampled
+    from a hash of it, so read, detect, encode, the vision request, the DB
+    write and the alert email all land in one trace without passing any
+    context along; batched stages record a span in each sampled frame's
+    trace. Unsampled frames cost a few integer operations per stage.
+    Finished spans are exported in batches on a background thread.
+    """
+
+    def __init__(self, sample_rate=TRACE_SAMPLE_RATE, exporter=None, max_queue=TRACE_QUEUE_SIZE):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or (OTLPExporter() if TRACE_OTLP_URL else FileExporter())
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def sampled(self, camera_id, frame_number):
+        return bool(self.sample_rate) and sample_point(camera_id, frame_number) < self.sample_rate
+
+    def span(self, name, keys, **attributes):
+        """Context manager timing a stage of the (camera_id, frame_number) frames in keys."""
+        if not self.sample_rate:
+            return NO_SPAN
+        keys = [key for key in keys if self.sampled(*key)]
+        if not keys:
+            return NO_SPAN
+        return Span(self, name, keys, attributes)
+
+    def frame_span(self, name, camera_id, frame_number, **attributes):
+        if not self.sampled(camera_id, frame_number):
+            return NO_SPAN
+        return Span(self, name, [(camera_id, frame_number)], attributes)
+
+    def record(self, name, camera_id, frame_number, start, end=None, **attributes):
+        """A span that already happened, start and end in time.time_ns()."""
+        if self.sampled(camera_id, frame_number):
+            self.export(name, [(camera_id, frame_number)], start, end or time.time_ns(), attributes)
+
+    def export(self, name, keys, start, end, attributes):
+        self._ensure_thread()
+        for camera_id, frame_number in keys:
+            span = {
+                "traceId": trace_id(camera_id, frame_number),
+                "spanId": f"{random.getrandbits(64):016x}",
+                "name": name,
+                "startTimeUnixNano": start,
+                "endTimeUnixNano": end,
+                "attributes": dict(
+                    attributes, camera_id=int(camera_id), frame_number=int(frame_number)
+                ),
+            }
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                self.dropped += 1
+                trace_spans_dropped.inc()
+
+    def _ensure_thread(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="tracer", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            spans = [self.queue.get()]
+            while len(spans) < EXPORT_BATCH:
+                try:
+                    spans.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(spans)
+                self.exported += len(spans)
+            except Exception as e:
+                self.dropped += len(spans)
+                trace_spans_dropped.inc(len(spans))
+                logger.warning("exporting %d spans failed: %s", len(spans), e)
+            finally:
+                for _ in spans:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Block until every finished span has been exported."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def stats(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+        }
+
+
+tracer = Tracer()
+
+
+def summarize(path, limit=10):
+    """The limit slowest traced frames, with each stage's offset and duration."""
+    traces = {}
+    with open(path) as f:
+        for line in f:
+            span = json.loads(line)
+            traces.setdefault(span["traceId"], []).append(span)
+    rows = []
+    for spans in traces.values():
+        spans.sort(key=lambda span: span["startTimeUnixNano"])
+        start = spans[0]["startTimeUnixNano"]
+        end = max(span["endTimeUnixNano"] for span in spans)
+        rows.append((end - start, spans))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    lines = []
+    for total, spans in rows[:limit]:
+        attributes = spans[0]["attributes"]
+        start = spans[0]["startTimeUnixNano"]
+        lines.append(
+            f"camera {attributes['camera_id']} frame {attributes['frame_number']}: "
+            f"{total / 1e6:.1f} ms"
+        )
+        for span in spans:
+            offset = (span["startTimeUnixNano"] - start) / 1e6
+            duration = (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+            error = f"  {span['attributes']['error']}" if "error" in span["attributes"] else ""
+            lines.append(f"  +{offset:9.1f} ms  {span['name']:<15} {duration:9.1f} ms{error}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Slowest frames: python tracing.py [traces.jsonl]
+    print(summarize(sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE))
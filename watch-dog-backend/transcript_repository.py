@@ -0,0 +1,73 @@
+from db import ACTIVITY_FLAGS, TranscriptDetailed, db
+from listing import keyset_select
+
+TRANSCRIPT_FIELDS = (
+    "id",
+    "frame_number",
+    "unusual_activity",
+    "human_activity",
+    "animal_activity",
+    "time",
+    "unusual_crowd",
+    "lighting_conditions",
+    "vehicle_details",
+    "number_of_individuals",
+    "object_presence",
+    "context_notes",
+    "created_at",
+)
+# What chat retrieval needs from a transcript
+CHAT_FIELDS = ("id", "frame_number", "context_notes", "unusual_activity")
+
+
+def transcript_columns(fields):
+    unknown = set(fields) - set(TRANSCRIPT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown transcript fields: {', '.join(sorted(unknown))}")
+    return [getattr(TranscriptDetailed, field) for field in fields]
+
+
+def transcripts_select(camera_id=None, fields=TRANSCRIPT_FIELDS, activity=None,
+                       after_id=None, limit=None, since=None, until=None):
+    """SELECT of transcript `fields` ordered by id, for keyset paging.
+
+    activity keeps only rows where that activity field isn't "none", through
+    its boolean flag (and partial index) when it has one. since/until bound
+    created_at.
+    """
+    transcript_columns(fields)
+    where = []
+    if camera_id is not None:
+        where.append(TranscriptDetailed.camera_id == camera_id)
+    if activity is not None:
+        transcript_columns((activity,))
+        if activity in ACTIVITY_FLAGS:
+            where.append(getattr(TranscriptDetailed, ACTIVITY_FLAGS[activity]).is_(True))
+        else:
+            where.append(getattr(TranscriptDetailed, activity) != "none")
+    return keyset_select(
+        TranscriptDetailed,
+        TranscriptDetailed.id,
+        fields,
+        where,
+        after_id,
+        limit,
+        TranscriptDetailed.created_at,
+        since,
+        until,
+    )
+
+
+def get_transcripts(camera_id, ids, fields=TRANSCRIPT_FIELDS):
+    """The camera's transcripts with the given ids as dicts of `fields`, in id order."""
+    if not ids:
+        return []
+    query = (
+        db.select(*transcript_columns(fields))
+        .where(
+            TranscriptDetailed.camera_id == camera_id,
+            TranscriptDetailed.id.in_(ids),
+        )
+        .order_by(TranscriptDetailed.id)
+    )
+    return [dict(row) for row in db.session.execute(query).mappings()]
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import aiohttp
+from metrics import vision_request_seconds, vision_responses
+
+logger = logging.getLogger(__name__)
+
+VISION_API_URL = os.getenv(
+    "VISION_API_URL",
+    "https://ai.api.nvidia.com/v1/gr/meta/llama-3.2-90b-vision-instruct/chat/completions",
+)
+# Caption requests allowed on the wire at once
+VISION_MAX_IN_FLIGHT = int(os.getenv("VISION_MAX_IN_FLIGHT", 8))
+# Seconds allowed for a single request attempt
+VISION_TIMEOUT = float(os.getenv("VISION_TIMEOUT", 60))
+VISION_MAX_RETRIES = int(os.getenv("VISION_MAX_RETRIES", 3))
+# Base delay in seconds for exponential backoff between retries
+VISION_BACKOFF = float(os.getenv("VISION_BACKOFF", 0.5))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class VisionAPIError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"Vision API returned {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+
+class VisionClient:
+    """Async client for the Llama vision chat completions endpoint.
+
+    Requests share one keep-alive connection pool sized to the in-flight
+    limit, so throughput grows with max_in_flight instead of being bound to
+    one round trip at a time. 429 and 5xx responses, timeouts and connection
+    errors are retried with exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        url=VISION_API_URL,
+        api_token=None,
+        max_in_flight=VISION_MAX_IN_FLIGHT,
+        timeout=VISION_TIMEOUT,
+        max_retries=VISION_MAX_RETRIES,
+        backoff=VISION_BACKOFF,
+    ):
+        self.url = url
+        self.api_token = api_token
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = None
+        self.semaphore = None
+
+    def _ensure_session(self):
+        # The session has to be created on the loop that will use it
+        if self.session is None or self.session.closed:
+            token = self.api_token or os.getenv("NVIDIA_API_TOKEN", "")
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_in_flight, keepalive_timeout=60
+                ),
+                headers={
+                    "Authorization": "Bearer " + token,
+                    "Accept": "application/json",
+                },
+                timeout=self.timeout,
+            )
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self.session
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2**attempt) * (0.5 + random.random())
+
+    def _request_kwargs(self, payload):
+        if isinstance(payload, dict):
+            return {"json": payload}
+        # A streamed body (captions.CaptionRequestBody): fresh chunks per attempt
+        return {
+            "data": payload.chunks(),
+            "headers": {
+                "Content-Type": "application/json",
+                "Content-Length": str(len(payload)),
+            },
+        }
+
+    async def complete(self, payload):
+        """POST a chat completion payload (dict or streamed body), return the JSON reply."""
+        session = self._ensure_session()
+        async with self.semaphore:
+            attempt = 0
+            while True:
+                retry_after = None
+                started = time.perf_counter()
+                status = "error"
+                try:
+                    async with session.post(
+                        self.url, **self._request_kwargs(payload)
+                    ) as response:
+                        status = response.status
+                        body = await response.text()
+                        if response.status == 200:
+                            try:
+                                return json.loads(body)
+                            except ValueError:
+                                # e.g. a proxy's HTML error page; not worth retrying
+                                raise VisionAPIError(response.status, body) from None
+                        if response.status not in RETRY_STATUSES:
+                            raise VisionAPIError(response.status, body)
+                        error = VisionAPIError(response.status, body)
+                        retry_after = response.headers.get("Retry-After")
+                except asyncio.TimeoutError as e:
+                    status = "timeout"
+                    error = e
+                except aiohttp.ClientConnectionError as e:
+                    error = e
+                finally:
+                    vision_request_seconds.observe(time.perf_counter() - started)
+                    vision_responses.labels(status).inc()
+                if attempt >= self.max_retries:
+                    raise error
+                delay = self._retry_delay(attempt, retry_after)
+                logger.warning(
+                    "vision request failed, retrying: %s",
+                    error,
+                    extra={"attempt": attempt + 1, "retry_in_s": round(delay, 1)},
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+vision_client = VisionClient()
@@ -10,6 +10,16 @@ import { ChevronDownIcon} from '@heroicons/react/24/outline'
 import { a } from 'framer-motion/client';
 import { FaExclamationTriangle } from 'react-icons/fa';
 
+// Longest side of the chat image thumbnails requested from the backend
+const THUMBNAIL_SIZE = 480;
+
+// The backend returns frame references; resolve them against the chat API host
+const frameUrls = (frames, chatUrl) =>
+  (frames || []).map((frame) => ({
+    src: new URL(frame.thumbnail_url || frame.url, chatUrl).href,
+    full: new URL(frame.url, chatUrl).href,
+  }));
+
 // Define the Camera interface
 interface Camera {
   id: number;
@@ -96,7 +106,7 @@ const WatchDogChat: React.FC = () => {
     var chatUrl= activeChat === 'AIMLAPI' ? CHAT_API_URL : LOCAL_CHAT_API_URL;
     
     try {
-      const response = await fetch(chatUrl+`${camera.id}`, {
+      const response = await fetch(chatUrl+`${camera.id}?thumbnail=${THUMBNAIL_SIZE}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -113,12 +123,12 @@ const WatchDogChat: React.FC = () => {
       
       setChatHistory((prev) => ({
         ...prev,
-        [activeChat]: data.map((chat) => ({
+        [activeChat]: data.chats.map((chat) => ({
           input: chat.user_query,
           response: chat.response,
           sentTime: new Date(chat.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
           receivedTime: new Date(chat.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }),
-          images: chat.frames || [],
+          images: frameUrls(chat.frames, chatUrl),
           imageCount: (chat.frames || []).length ,
           loading: false,
           camera: camera, // Store the selected camera
@@ -186,7 +196,7 @@ const WatchDogChat: React.FC = () => {
       try {
         const chatUrl = activeChat === 'AIMLAPI' ? CHAT_API_URL : LOCAL_CHAT_API_URL;
         // Replace the timeout with a real API call
-        const response = await fetch(chatUrl+`${selectedCam.id}`, {
+        const response = await fetch(chatUrl+`${selectedCam.id}?thumbnail=${THUMBNAIL_SIZE}`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -212,7 +222,7 @@ const WatchDogChat: React.FC = () => {
             camera: selectedCam,
             loading: false,
             receivedTime: receivedTime,
-            images: data.frames || [], // Assuming backend returns 'frames'
+            images: frameUrls(data.frames, chatUrl),
             imageCount: (data.frames || []).length  
           };
    
@@ -255,12 +265,12 @@ const WatchDogChat: React.FC = () => {
     scrollToBottom();
   }, [chatHistory]); // Trigger the scroll whenever chatHistory changes
 
-  const downloadImage = (base64Image, fileName) => {
+  const downloadImage = (imageUrl, fileName) => {
     const link = document.createElement("a");
   
     link.download = fileName;
   
-    link.href = `${base64Image}`;
+    link.href = imageUrl;
   
     // Append the link to the body temporarily
     document.body.appendChild(link);
@@ -381,12 +391,12 @@ const WatchDogChat: React.FC = () => {
                             <div key={index} className="group relative">
                               <div className="absolute w-full h-full bg-gray-900/50 opacity-0 group-hover:opacity-100 transition-opacity duration-300 rounded-lg flex items-center justify-center">
                                 <button
-                                  onClick={() => downloadImage(`data:image/png;base64,${image}`, selectedCam.name+`-image-${index + 1}.png`)} // Call the download function
+                                  onClick={() => downloadImage(image.full, selectedCam.name+`-image-${index + 1}.jpg`)} // Call the download function
                                   className="inline-flex items-center justify-center rounded-full h-8 w-8 bg-white/30 hover:bg-white/50 focus:ring-4 focus:outline-none dark:text-white focus:ring-gray-50">
                                   <ArrowDownTrayIcon className="h-5 w-5" aria-hidden="true" />
                                 </button>
                               </div>
-                              <img src={`data:image/png;base64,${image}`} alt={`Image ${index + 1}`} className="rounded-lg h-full w-full" />
+                              <img src={image.src} alt={`Image ${index + 1}`} className="rounded-lg h-full w-full" />
                             </div>
                           ))}
 
@@ -395,7 +405,7 @@ const WatchDogChat: React.FC = () => {
                               <button className="absolute w-full h-full bg-gray-900/90 hover:bg-gray-900/50 transition-all duration-300 rounded-lg flex items-center justify-center">
                                 <span className="text-xl font-medium text-white">+{chat.images.length - 3}</span>
                               </button>
-                              <img src={`data:image/png;base64,${chat.images[3]}`} className="rounded-lg" alt="Extra images" />
+                              <img src={chat.images[3].src} className="rounded-lg" alt="Extra images" />
                             </div>
                           )}
                         </div>